@@ -18,24 +18,42 @@
 #######################################################################
 
 from datetime import datetime
+import fcntl
 import os
 import shutil
+import signal
+import socket
 import subprocess
 import sys
+import threading
 import time
 
 import lib_database
+import lib_dedup
+import lib_exiftool
 import lib_mail
 import lib_media
+import lib_permissions
+import lib_pipeline
+import lib_routing
+import lib_scan
 import lib_setup
+import lib_targetdirs
+import lib_transfer
+import lib_watch
 
 class archivist(object):
 
-	def __init__(self, ConfigFilePath):
+	def __init__(self, ConfigFilePath, exiftool=None, limits=None):
+		# exiftool, limits: shared with other archivists of the same process
 
 		# config
 		self.ConfigFilePath		= ConfigFilePath
 
+		# False: the report is sent by the caller, see self.Report
+		self.SendMail			= True
+		self.Report				= (0, 0, {})
+
 		# objects
 		self.__setup			= lib_setup.setup(ConfigFilePath)
 
@@ -50,7 +68,7 @@ class archivist(object):
 
 		self.__conf_MOVE_FILES								= self.__setup.get_val('conf_MOVE_FILES')
 		self.__conf_RENAME_FILES							= self.__setup.get_val('conf_RENAME_FILES')
-		self.__conf_OVERWRITE								= self.__setup.get_val('__conf_OVERWRITE')
+		self.__conf_OVERWRITE								= self.__setup.get_val('conf_OVERWRITE')
 
 		self.__conf_SET_USER								= self.__setup.get_val('conf_SET_USER')
 		self.__conf_SET_GROUP								= self.__setup.get_val('conf_SET_GROUP')
@@ -63,6 +81,7 @@ class archivist(object):
 		self.__conf_FILE_EXTENSIONS_LIST_VIDEO				= self.__setup.get_val('conf_FILE_EXTENSIONS_LIST_VIDEO').split(';')
 		self.__conf_FILE_EXTENSIONS_LIST_AUDIO				= self.__setup.get_val('conf_FILE_EXTENSIONS_LIST_AUDIO').split(';')
 		self.__conf_FILE_EXTENSIONS_LIST_GEO				= self.__setup.get_val('conf_FILE_EXTENSIONS_LIST_GEO').split(';')
+		self.__conf_FILE_EXTENSIONS_LIST_SIDECAR			= self.__setup.get_val('conf_FILE_EXTENSIONS_LIST_SIDECAR').split(';')
 
 		self.__conf_FILE_EXTENSIONS_SUBFOLDER_WEB_IMAGES	= self.__setup.get_val('conf_FILE_EXTENSIONS_SUBFOLDER_WEB_IMAGES')
 		self.__conf_FILE_EXTENSIONS_SUBFOLDER_HEIC			= self.__setup.get_val('conf_FILE_EXTENSIONS_SUBFOLDER_HEIC')
@@ -72,195 +91,766 @@ class archivist(object):
 		self.__conf_FILE_EXTENSIONS_SUBFOLDER_AUDIO			= self.__setup.get_val('conf_FILE_EXTENSIONS_SUBFOLDER_AUDIO')
 		self.__conf_FILE_EXTENSIONS_SUBFOLDER_GEO			= self.__setup.get_val('conf_FILE_EXTENSIONS_SUBFOLDER_GEO')
 
+		self.__conf_METADATA_STRATEGY_WEB_IMAGES			= self.__setup.get_val('conf_METADATA_STRATEGY_WEB_IMAGES')
+		self.__conf_METADATA_STRATEGY_HEIC					= self.__setup.get_val('conf_METADATA_STRATEGY_HEIC')
+		self.__conf_METADATA_STRATEGY_RAW					= self.__setup.get_val('conf_METADATA_STRATEGY_RAW')
+		self.__conf_METADATA_STRATEGY_TIF					= self.__setup.get_val('conf_METADATA_STRATEGY_TIF')
+		self.__conf_METADATA_STRATEGY_VIDEO					= self.__setup.get_val('conf_METADATA_STRATEGY_VIDEO')
+		self.__conf_METADATA_STRATEGY_AUDIO					= self.__setup.get_val('conf_METADATA_STRATEGY_AUDIO')
+		self.__conf_METADATA_STRATEGY_GEO					= self.__setup.get_val('conf_METADATA_STRATEGY_GEO')
+
+		self.__conf_ROUTING_TEMPLATE				= self.__setup.get_val('conf_ROUTING_TEMPLATE')
+		self.__conf_ROUTING_RULES					= self.__setup.get_val('conf_ROUTING_RULES')
+		self.__conf_GROUP_FILES						= self.__setup.get_val('conf_GROUP_FILES')
+
+		self.__conf_SCAN_INCREMENTAL				= self.__setup.get_val('conf_SCAN_INCREMENTAL')
+		self.__conf_SCAN_FULL_INTERVAL_HOURS		= self.__setup.get_val('conf_SCAN_FULL_INTERVAL_HOURS')
+
+		self.__conf_WATCH_DEBOUNCE_SEC				= self.__setup.get_val('conf_WATCH_DEBOUNCE_SEC')
+		self.__conf_WATCH_RECONCILE_MIN				= self.__setup.get_val('conf_WATCH_RECONCILE_MIN')
+		self.__conf_WATCH_POLL_SEC					= self.__setup.get_val('conf_WATCH_POLL_SEC')
+
 		self.__conf_DB_MIN_IDLE_SEC					= self.__setup.get_val('conf_DB_MIN_IDLE_SEC')
+		self.__conf_DB_JOURNAL_MODE					= self.__setup.get_val('conf_DB_JOURNAL_MODE')
+		self.__conf_DB_SYNCHRONOUS					= self.__setup.get_val('conf_DB_SYNCHRONOUS')
+		self.__conf_DB_COMMIT_FILES					= self.__setup.get_val('conf_DB_COMMIT_FILES')
+		self.__conf_DB_COMMIT_SEC					= self.__setup.get_val('conf_DB_COMMIT_SEC')
+		self.__conf_MULTI_WORKER					= self.__setup.get_val('conf_MULTI_WORKER')
+		self.__conf_LEASE_SEC						= self.__setup.get_val('conf_LEASE_SEC')
+		self.__conf_LEASE_BATCH						= self.__setup.get_val('conf_LEASE_BATCH')
 		self.__conf_MIN_MEDIA_FILE_AGE_SEC			= self.__setup.get_val('conf_MIN_MEDIA_FILE_AGE_SEC')
+		self.__conf_RUN_DEADLINE_SEC				= self.__setup.get_val('conf_RUN_DEADLINE_SEC')
+
+		self.__conf_METADATA_WORKERS				= self.__setup.get_val('conf_METADATA_WORKERS')
+		self.__conf_TRANSFER_WORKERS				= self.__setup.get_val('conf_TRANSFER_WORKERS')
+		self.__conf_TRANSFER_SOURCE_DEVICE_LIMIT	= self.__setup.get_val('conf_TRANSFER_SOURCE_DEVICE_LIMIT')
+		self.__conf_COPY_METHODS					= [Method.strip().lower() for Method in self.__setup.get_val('conf_COPY_METHODS').split(';')]
+		self.__conf_VERIFY_TRANSFER					= self.__setup.get_val('conf_VERIFY_TRANSFER')
+		self.__conf_RESUME_MIN_SIZE_MB				= self.__setup.get_val('conf_RESUME_MIN_SIZE_MB')
+		self.__conf_TRANSFER_TARGET_DEVICE_LIMIT	= self.__setup.get_val('conf_TRANSFER_TARGET_DEVICE_LIMIT')
+
+		self.__conf_PIPELINE_QUEUE_SIZE				= self.__setup.get_val('conf_PIPELINE_QUEUE_SIZE')
+		self.__conf_PIPELINE_STATUS_SEC				= self.__setup.get_val('conf_PIPELINE_STATUS_SEC')
+		self.__conf_TRANSFER_ORDER					= self.__setup.get_val('conf_TRANSFER_ORDER').strip().lower()
+		self.__conf_TRANSFER_ORDER_WINDOW			= self.__setup.get_val('conf_TRANSFER_ORDER_WINDOW')
+
+		if not self.__conf_TRANSFER_ORDER in lib_transfer.ORDER_POLICIES:
+			sys.exit(f"Please edit the config file '{ConfigFilePath}': conf_TRANSFER_ORDER must be one of {', '.join(lib_transfer.ORDER_POLICIES)}")
 
 		self.__conf_EXEC_SCRIPT_IF_SUCCESS			= self.__setup.get_val('conf_EXEC_SCRIPT_IF_SUCCESS')
 
+		self.__conf_FILENAME_DATES_HIGH_TRUST		= self.__setup.get_val('conf_FILENAME_DATES_HIGH_TRUST')
+		self.__conf_FILENAME_DATES_LOW_TRUST		= self.__setup.get_val('conf_FILENAME_DATES_LOW_TRUST')
+		self.__conf_METADATA_NATIVE					= self.__setup.get_val('conf_METADATA_NATIVE')
+		self.__conf_EXIFTOOL_WORKERS				= self.__setup.get_val('conf_EXIFTOOL_WORKERS')
+		self.__conf_EXIFTOOL_TIMEOUT_SEC			= self.__setup.get_val('conf_EXIFTOOL_TIMEOUT_SEC')
 
-		self.media_extensions	= 	self.__conf_FILE_EXTENSIONS_LIST_WEB_IMAGES + \
-									self.__conf_FILE_EXTENSIONS_LIST_HEIC + \
-									self.__conf_FILE_EXTENSIONS_LIST_RAW + \
-									self.__conf_FILE_EXTENSIONS_LIST_TIF + \
-									self.__conf_FILE_EXTENSIONS_LIST_VIDEO + \
-									self.__conf_FILE_EXTENSIONS_LIST_AUDIO + \
-									self.__conf_FILE_EXTENSIONS_LIST_GEO
+		self.__conf_TARGET_INDEX					= self.__setup.get_val('conf_TARGET_INDEX')
+		self.__conf_DEDUP							= self.__setup.get_val('conf_DEDUP')
+		self.__conf_DEDUP_ACTION					= self.__setup.get_val('conf_DEDUP_ACTION').strip().lower()
 
-		self.database_path	= os.path.join(self.__conf_SOURCE_DIR,'archivist.sqlite3')
+		if not self.__conf_DEDUP_ACTION in lib_dedup.DEDUP_ACTIONS:
+			sys.exit(f"Please edit the config file '{ConfigFilePath}': conf_DEDUP_ACTION must be one of {', '.join(lib_dedup.DEDUP_ACTIONS)}")
 
-		# be sure there is no active archivist prozess using the same database
-		if os.path.isfile(self.database_path):
-			if (time.time() - os.path.getmtime(self.database_path)) < self.__conf_DB_MIN_IDLE_SEC:
-				sys.exit('archivist already working.')
 
-		self.db	= lib_database.database(self.database_path)
+		# the extension lists and subfolders are the default rules, conf_ROUTING_RULES add to them
+		self.router	= lib_routing.router(
+			[
+				('web_images',	self.__conf_FILE_EXTENSIONS_LIST_WEB_IMAGES,	self.__conf_FILE_EXTENSIONS_SUBFOLDER_WEB_IMAGES),
+				('heic',		self.__conf_FILE_EXTENSIONS_LIST_HEIC,			self.__conf_FILE_EXTENSIONS_SUBFOLDER_HEIC),
+				('raw',			self.__conf_FILE_EXTENSIONS_LIST_RAW,			self.__conf_FILE_EXTENSIONS_SUBFOLDER_RAW),
+				('tif',			self.__conf_FILE_EXTENSIONS_LIST_TIF,			self.__conf_FILE_EXTENSIONS_SUBFOLDER_TIF),
+				('video',		self.__conf_FILE_EXTENSIONS_LIST_VIDEO,			self.__conf_FILE_EXTENSIONS_SUBFOLDER_VIDEO),
+				('audio',		self.__conf_FILE_EXTENSIONS_LIST_AUDIO,			self.__conf_FILE_EXTENSIONS_SUBFOLDER_AUDIO),
+				('geo',			self.__conf_FILE_EXTENSIONS_LIST_GEO,			self.__conf_FILE_EXTENSIONS_SUBFOLDER_GEO),
+				(lib_routing.SIDECAR,	self.__conf_FILE_EXTENSIONS_LIST_SIDECAR,	'')
+			] + lib_routing.parse_rules(self.__conf_ROUTING_RULES),
+			self.__conf_ROUTING_TEMPLATE
+		)
 
-	def run(self):
-		DirsCreated		= 0
-		FilesProcessed	= 0
+		self.media_extensions	= list(self.router.Extensions.keys())
 
-		print(f'\nArchivist: Starting transfer from {self.__conf_SOURCE_DIR} to {self.__conf_TARGET_DIR} ...')
+		# how the metadata of the files of a category is read
+		self.read_strategies	= {
+			'web_images':	lib_media.readstrategy(self.__conf_METADATA_STRATEGY_WEB_IMAGES),
+			'heic':			lib_media.readstrategy(self.__conf_METADATA_STRATEGY_HEIC),
+			'raw':			lib_media.readstrategy(self.__conf_METADATA_STRATEGY_RAW),
+			'tif':			lib_media.readstrategy(self.__conf_METADATA_STRATEGY_TIF),
+			'video':		lib_media.readstrategy(self.__conf_METADATA_STRATEGY_VIDEO),
+			'audio':		lib_media.readstrategy(self.__conf_METADATA_STRATEGY_AUDIO),
+			'geo':			lib_media.readstrategy(self.__conf_METADATA_STRATEGY_GEO)
+		}
 
-		# create list of valid extensions
-		AllowedExtensionsOptions	= []
-		for AllowedExtension in self.media_extensions:
-			if AllowedExtensionsOptions:
-				AllowedExtensionsOptions	+= ["-o"]
+		self.permissions	= lib_permissions.permissions(self.__conf_SET_USER, self.__conf_SET_GROUP, self.__conf_SET_PERMISSIONS)
 
-			AllowedExtensionsOptions	+= ["-iname", f"'*.{AllowedExtension}'"]
+		self.limits	= lib_transfer.devicelimits(self.__conf_TRANSFER_SOURCE_DEVICE_LIMIT, self.__conf_TRANSFER_TARGET_DEVICE_LIMIT) if limits is None else limits
 
-		Command	= f"find '{self.__conf_SOURCE_DIR}' -type f \( {' '.join(AllowedExtensionsOptions)} \)"
+		self.__shared_exiftool	= exiftool
 
-		MediaFilePathList	= subprocess.check_output(Command,shell=True).decode().strip().split('\n')
-		MediaFilePathList	= list(filter(None, MediaFilePathList)) # remove None items
+		self.filename_patterns	= lib_media.get_filename_patterns(self.__conf_FILENAME_DATES_HIGH_TRUST, self.__conf_FILENAME_DATES_LOW_TRUST)
 
-		FilesAtTarget	= {}
+		self.database_path	= os.path.join(self.__conf_SOURCE_DIR,'archivist.sqlite3')
+
+		# files at the target by content, shared by all sources archiving to this target
+		self.index_path		= os.path.join(self.__conf_TARGET_DIR,'archivist-index.sqlite3')
+
+		# one archivist per source, the workers of the multi-worker mode share the lock
+		self.__lock_file	= open(os.path.join(self.__conf_SOURCE_DIR,'archivist.lock'), 'a')
+		try:
+			fcntl.flock(self.__lock_file, (fcntl.LOCK_SH if self.__conf_MULTI_WORKER else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+		except BlockingIOError:
+			sys.exit('archivist already working.')
+		except OSError:
+			# no locks on this file system: be sure there is no active archivist prozess using the same database (in WAL mode changes go to the -wal file first)
+			if not self.__conf_MULTI_WORKER:
+				for DatabaseFile in [self.database_path, f'{self.database_path}-wal']:
+					if os.path.isfile(DatabaseFile):
+						if (time.time() - os.path.getmtime(DatabaseFile)) < self.__conf_DB_MIN_IDLE_SEC:
+							sys.exit('archivist already working.')
+
+		# multi-worker mode: files are claimed by this name, other workers wait for the database
+		self.__owner	= f'{socket.gethostname()}:{os.getpid()}'
+		BusyTimeoutSec	= 60 if self.__conf_MULTI_WORKER else 5
+
+		self.db	= lib_database.database(
+			self.database_path,
+			self.__conf_DB_JOURNAL_MODE,
+			self.__conf_DB_SYNCHRONOUS,
+			self.__conf_DB_COMMIT_FILES,
+			self.__conf_DB_COMMIT_SEC,
+			BusyTimeoutSec
+		)
+
+		self.index	= None
+
+	def close(self):
+		# releases the databases and the lock of the source, needed if the process goes on with another source
+		if not self.index is None:
+			self.index.dbClose()
+			self.index	= None
+
+		if not self.db is None:
+			self.db.dbClose()
+			self.db	= None
+
+		self.__lock_file.close()
+
+	def run(self):
+		self.__open()
 
-		for MediaFilePath in MediaFilePathList:
-			SourceModificationTime	= os.path.getmtime(MediaFilePath)
+		try:
+			self.__run()
+		finally:
+			self.__close()
 
-			if not self.db.dbMediaFileKnown(MediaFilePath, SourceModificationTime):
+	def watch(self):
+		# runs until terminated: changed folders are processed as soon as they are quiet, all folders from time to time
+		self.__open()
 
-				print(f"\nFile: {MediaFilePath}")
+		Watcher	= lib_watch.watcher(self.__conf_SOURCE_DIR, self.media_extensions, [self.__conf_TARGET_DIR], self.__conf_WATCH_POLL_SEC)
 
-				# wait until copy has finished
-				while time.time() - os.path.getmtime(MediaFilePath) < self.__conf_MIN_MEDIA_FILE_AGE_SEC:
-					print('.')
-					time.sleep(1)
+		try:
+			print(f"\nArchivist: Watching {self.__conf_SOURCE_DIR} ({'inotify' if Watcher.inotify() else 'polling'}) ...")
 
-				fileobj	= lib_media.mediafile(MediaFilePath, self.__conf_RENAME_FILES)
+			while True:
+				# reconciliation: changes missed by the watcher are found by an incremental scan
+				self.__run()
+				self.__flush()
 
-				# target path
-				TargetPath	= os.path.join(
-					self.__conf_TARGET_DIR,
-					fileobj.get_new_FilePath()
-				)
+				ReconcileTime	= time.time() + self.__conf_WATCH_RECONCILE_MIN * 60
 
-				# special subfolders
-				MediaFileExt	= os.path.splitext(MediaFilePath)[1][1:].lower()
+				while time.time() < ReconcileTime:
+					Dirs	= Watcher.wait(ReconcileTime - time.time(), self.__conf_WATCH_DEBOUNCE_SEC)
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_WEB_IMAGES:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_WEB_IMAGES):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_WEB_IMAGES)
+					if Dirs is None:
+						# polling or events lost
+						self.__run()
+					elif Dirs:
+						self.__run(Dirs)
+					else:
+						continue
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_HEIC:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_HEIC):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_HEIC)
+					self.__flush()
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_RAW:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_RAW):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_RAW)
+		finally:
+			Watcher.close()
+			self.__close()
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_TIF:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_TIF):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_TIF)
+	def __open(self):
+		# exiftool workers stay alive for the whole run
+		if self.__shared_exiftool is None:
+			self.exiftool	= lib_exiftool.pool(self.__conf_EXIFTOOL_WORKERS, self.__conf_EXIFTOOL_TIMEOUT_SEC)
+		else:
+			self.exiftool	= self.__shared_exiftool
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_VIDEO:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_VIDEO):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_VIDEO)
+		self.index	= self.__open_index() if self.__conf_TARGET_INDEX else None
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_AUDIO:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_AUDIO):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_AUDIO)
+	def __close(self):
+		if self.__shared_exiftool is None:
+			self.exiftool.close()
 
-				if self.__conf_FILE_EXTENSIONS_SUBFOLDER_GEO:
-					if MediaFileExt in (extension.lower() for extension in self.__conf_FILE_EXTENSIONS_LIST_GEO):
-						TargetPath	= os.path.join(TargetPath, self.__conf_FILE_EXTENSIONS_SUBFOLDER_GEO)
+		# also if interrupted: all files transferred so far are recorded
+		self.db.dbFlush()
 
-				# create target path
-				print(f"TargetPath: {TargetPath}")
+		if not self.index is None:
+			self.index.dbClose()
+			self.index	= None
 
-				if not os.path.isdir(TargetPath):
-					DirsCreated	+= 1
-					os.makedirs(TargetPath, exist_ok=True)
+	def __flush(self):
+		# the records of a run are committed while the process keeps running
+		self.db.dbFlush()
 
-				# FileName
-				TargetFileName	= fileobj.get_new_FileName()
+		if not self.index is None:
+			self.index.dbFlush()
 
-				# target file path and name
-				TargetFilePathName	= os.path.join(TargetPath, TargetFileName)
+	def __run(self, Dirs=None):
+		# Dirs: {DirPath: Recursive} of the folders changed, None: the whole source
+		# counters and report: folders counted by the route stage, files by the record stage
+		self.DirsCreated		= 0
+		self.FilesProcessed		= 0
+		self.FilesDuplicate		= 0
+		self.FilesAtTarget		= {}
 
-				if not os.path.isfile(TargetFilePathName) or self.__conf_OVERWRITE:
-					FilesProcessed	+= 1
-					# transfer
-					if self.__conf_MOVE_FILES:
-						print(f"move '{MediaFilePath}' to '{TargetFilePathName}'")
-						shutil.move(MediaFilePath, TargetFilePathName)
-					else:
-						print(f"copy '{MediaFilePath}' to '{TargetFilePathName}'")
-						shutil.copy(MediaFilePath, TargetFilePathName)
+		self.__TargetDirs		= lib_targetdirs.targetdirs()
+		self.__TargetJobs		= {}
+		self.__TouchedDirs		= set()
+
+		self.__dedup			= lib_dedup.dedup(self.index) if self.__conf_DEDUP else None
+
+		# bytes read for the dates: by the header reader (route stage) and by exiftool
+		self.__MetadataBytes	= 0
+		ExiftoolBytesStart		= self.exiftool.bytes_read()
+
+		# used by the record stage: transfers do not wait for exiftool
+		self.__createdates		= lib_media.createdatewriter(self.exiftool)
+
+		print(f'\nArchivist: Starting transfer from {self.__conf_SOURCE_DIR} to {self.__conf_TARGET_DIR} ...')
 
-					if not fileobj.exifdate_exists:
-						print(f"Writing 'Create Date' into media file: {fileobj.year}:{fileobj.month}:{fileobj.day} {fileobj.hour}:{fileobj.minute}:{fileobj.second}")
-						CreateDate	= f"{fileobj.year}:{fileobj.month}:{fileobj.day} {fileobj.hour}:{fileobj.minute}:{fileobj.second}"
-						Command	= ['exiftool', '-overwrite_original', f"-CreateDate='{CreateDate}'", TargetFilePathName]
-						subprocess.run(Command)
+		# unchanged directories are skipped, a full scan is forced from time to time
+		ScanStartTime	= time.time()
+		FullScan		= (Dirs is None) and ((not self.__conf_SCAN_INCREMENTAL) or (ScanStartTime - self.db.dbGetLastFullScan() >= self.__conf_SCAN_FULL_INTERVAL_HOURS * 3600))
+
+		# files are processed while the scan is still running
+		Scanner	= lib_scan.scanner(
+			self.__conf_SOURCE_DIR,
+			self.media_extensions,
+			[self.__conf_TARGET_DIR],
+			None if FullScan else self.db.dbGetSourceDirs(),
+			self.db.dbMediaFilesKnown,
+			self.__conf_FILE_EXTENSIONS_LIST_SIDECAR,
+			self.router.get_authority if self.__conf_GROUP_FILES else None
+		)
+		self.__scanner	= Scanner
+
+		# scan -> metadata -> route -> transfer -> record
+		self.__transfer	= lib_transfer.transfer(
+			self.__conf_MOVE_FILES,
+			self.limits,
+			self.permissions,
+			self.__conf_COPY_METHODS,
+			self.__conf_DEDUP_ACTION,
+			self.__conf_VERIFY_TRANSFER,
+			self.db if self.__conf_RESUME_MIN_SIZE_MB > 0 else None,
+			self.__conf_RESUME_MIN_SIZE_MB * 1048576,
+			self.__conf_OVERWRITE or not self.__conf_MULTI_WORKER
+		)
+
+		OnDrop	= lambda Item: Scanner.mark_dirty(Item.SourceFile.FilePathName)
+
+		def OnDropJob(Job):
+			# transfer workers may wait for a dropped job
+			OnDrop(Job)
+			Job.drop()
+
+		# routed files are passed to the transfer in groups sorted by the transfer order
+		SortKey	= None if self.__conf_TRANSFER_ORDER == 'scan' else lambda Job: lib_transfer.order_key(Job, self.__conf_TRANSFER_ORDER)
+
+		Pipeline	= lib_pipeline.pipeline(
+			[
+				lib_pipeline.stage('metadata', self.__stage_metadata, self.__conf_METADATA_WORKERS, self.__conf_PIPELINE_QUEUE_SIZE, OnDrop=OnDrop),
+				lib_pipeline.stage('route', self.__stage_route, 1, self.__conf_PIPELINE_QUEUE_SIZE, Ordered=True, OnDrop=OnDrop, SortKey=SortKey, Window=self.__conf_TRANSFER_ORDER_WINDOW),
+				lib_pipeline.stage('transfer', self.__stage_transfer, self.__conf_TRANSFER_WORKERS, self.__conf_PIPELINE_QUEUE_SIZE, OnDrop=OnDropJob),
+				lib_pipeline.stage('record', self.__stage_record, 1, self.__conf_PIPELINE_QUEUE_SIZE, OnIdle=self.db.dbCommitPending)
+			],
+			self.__conf_PIPELINE_STATUS_SEC
+		)
+		Pipeline.start()
+
+		# files still being written are deferred until all other files are done
+		Settle	= lib_scan.settlequeue(self.__conf_MIN_MEDIA_FILE_AGE_SEC, self.__conf_RUN_DEADLINE_SEC)
+
+		# multi-worker mode: the leases of this run are renewed until it ends
+		LeasesDone	= threading.Event()
+		if self.__conf_MULTI_WORKER:
+			threading.Thread(target=self.__renew_leases, args=(LeasesDone,), daemon=True).start()
+
+		try:
+			Seq	= 0
+			for SourceFile in self.__claim(Scanner.scan(Dirs), Scanner):
+				if not Settle.is_settled(SourceFile):
+					Settle.add(SourceFile)
+					continue
+
+				Pipeline.put(lib_pipeline.item(Seq, SourceFile))
+				Seq	+= 1
+
+			# every file is waited for until its own deadline
+			while Settle.pending():
+				time.sleep(1)
+
+				for SourceFile in Settle.poll():
+					Pipeline.put(lib_pipeline.item(Seq, SourceFile))
+					Seq	+= 1
+
+			# not settled in time: next run
+			if Settle.Expired:
+				print(f"\n{len(Settle.Expired)} files still being written, left for the next run.")
+
+				for SourceFile in Settle.Expired:
+					Scanner.mark_dirty(SourceFile.FilePathName)
+
+		except BaseException:
+			# interrupted: finish running transfers and record them
+			Pipeline.abort()
+			raise
+
+		finally:
+			Pipeline.close()
+
+			# files not done are free for the other workers
+			if self.__conf_MULTI_WORKER:
+				LeasesDone.set()
+				self.db.dbReleaseLeases(self.__owner)
+
+			# before exiftool writes the create dates
+			MetadataBytes	= self.__MetadataBytes + self.exiftool.bytes_read() - ExiftoolBytesStart
+
+			self.__createdates.flush()
+
+			# changed by exiftool: known as changed files by the index
+			if not self.index is None:
+				for FilePathName, CreateDate in self.__createdates.Written:
+					try:
+						self.index.dbSetTargetFileStat(FilePathName, os.stat(FilePathName))
+					except OSError:
+						pass
+
+		print(f"\nPipeline: {Scanner.FilesFound} files found, {Scanner.FilesKnown} known. Maximum queue depths: {Pipeline.max_depths()}")
+
+		if self.__transfer.MethodsUsed:
+			print(f"Transfer methods used: {', '.join(f'{Method} {Count}' for Method, Count in self.__transfer.MethodsUsed.items())}")
+
+		print(f"Bytes read for metadata: {MetadataBytes / 1048576:.1f} MB, bytes copied: {self.__transfer.BytesCopied / 1048576:.1f} MB")
+
+		DirsCreated		= self.DirsCreated
+		FilesProcessed	= self.FilesProcessed
+		FilesAtTarget	= self.FilesAtTarget
+
+		# remember the state of the scanned directories
+		if self.__conf_SCAN_INCREMENTAL:
+			self.db.dbSetSourceDirs(Scanner.get_snapshots(), Replace=FullScan)
 
-				self.db.dbInsertMediaFile(MediaFilePath, SourceModificationTime)
+			if FullScan:
+				self.db.dbSetLastFullScan(ScanStartTime)
 
-				TargetSubPath	= TargetPath.replace(self.__conf_TARGET_DIR, '', 1).strip('/')
-				if TargetSubPath not in FilesAtTarget.keys():
-					FilesAtTarget[TargetSubPath]	= []
-				FilesAtTarget[TargetSubPath].append(os.path.basename(MediaFilePath))
+		if Scanner.DirsSkipped:
+			print(f"\n{Scanner.DirsSkipped} unchanged folders skipped, {Scanner.DirsScanned} folders scanned.")
 
 		print(f"\n * {FilesProcessed} files processed.")
 		print(f" * {DirsCreated} new folders created.")
 
+		if self.FilesDuplicate:
+			print(f" * {self.FilesDuplicate} duplicates of files at the target ({self.__conf_DEDUP_ACTION}).")
+
+		if self.__createdates.Written:
+			print(f"\nCreate date written into {len(self.__createdates.Written)} files:")
+			for FilePathName, CreateDate in self.__createdates.Written:
+				print(f" - {FilePathName}: {CreateDate}")
+
+		if self.__createdates.Failed:
+			print(f"\nCreate date could not be written into {len(self.__createdates.Failed)} files:")
+			for FilePathName, CreateDate in self.__createdates.Failed:
+				print(f" - {FilePathName}: {CreateDate}")
+
 		for TargetSubPath in FilesAtTarget.keys():
 			print(f"\n{TargetSubPath}")
 			for FileName in FilesAtTarget[TargetSubPath]:
 				print(f" - {FileName}")
 
+		self.Report	= (FilesProcessed, DirsCreated, FilesAtTarget)
+
+		if self.SendMail and ((FilesProcessed > 0) or (DirsCreated > 0)):
+			send_report(self.__setup, f'archivist: {self.ConfigFilePath}', [(None, FilesProcessed, DirsCreated, FilesAtTarget)])
+
+		# ownership and permissions were set while the files arrived, symbolic modes are set in groups
+		self.permissions.flush()
+
 		if (FilesProcessed > 0) or (DirsCreated > 0):
-			mail	= lib_mail.mail(self.__setup)
 
-			if mail.mail_configured():
-				mail_subject	= f'archivist: {ConfigFilePath}'
+			if self.__conf_EXEC_SCRIPT_IF_SUCCESS:
+				try:
+					subprocess.run(self.__conf_EXEC_SCRIPT_IF_SUCCESS, shell=True)
+				except:
+					print('Your script defined in conf_EXEC_SCRIPT_IF_SUCCESS raised an error.')
 
-				mail_text_plain	= f"""
- * {FilesProcessed} files processed.
- * {DirsCreated} new folders created.
-				"""
+		print ('\nFinished.')
 
-				for TargetSubPath in FilesAtTarget.keys():
-					mail_text_plain	+= f"\n\n{TargetSubPath}"
+	def __claim(self, Files, Scanner):
+		# multi-worker mode: yields the groups of files claimed by this worker, claims in batches
+		if not self.__conf_MULTI_WORKER:
+			yield from Files
+			return
 
-					for FileName in FilesAtTarget[TargetSubPath]:
-						mail_text_plain	+= f"\n - {FileName}"
+		Batch	= []
+		for File in Files:
+			Batch.append(File)
 
-				mail_text_html	= f"""
-<ul>
-	<li>{FilesProcessed} files processed.</li>
-	<li>{DirsCreated} new folders created.</li>
-</ul>
-				"""
-				for TargetSubPath in FilesAtTarget.keys():
-					mail_text_html	+= f"<h3>{TargetSubPath}</h3>"
+			if len(Batch) >= self.__conf_LEASE_BATCH:
+				yield from self.__claim_batch(Batch, Scanner)
+				Batch	= []
 
-					mail_text_html	+= "\n<ul>"
-					for FileName in FilesAtTarget[TargetSubPath]:
-						mail_text_html	+= f"\n<li>{FileName}</li>"
-					mail_text_html	+= "\n</ul>"
+		yield from self.__claim_batch(Batch, Scanner)
 
-				mail.sendmail(Subject=mail_subject, TextPlain=mail_text_plain, TextHTML=mail_text_html)
+	def __claim_batch(self, Batch, Scanner):
+		Members	= [Member for File in Batch for Member in File.files() if not Member.Known]
+		if not Members:
+			return
 
-		if (FilesProcessed > 0) or (DirsCreated > 0):
+		Claimed, Archived	= self.db.dbClaimMediaFiles([(Member.FilePathName, Member.ModificationTime) for Member in Members], self.__owner, self.__conf_LEASE_SEC)
 
-			if self.__conf_SET_USER and self.__conf_SET_GROUP:
-				print(f"Setting ownership to {self.__conf_SET_USER}:{self.__conf_SET_GROUP} ...")
-				subprocess.run(['chown', '-R', f"{self.__conf_SET_USER}:{self.__conf_SET_GROUP}", self.__conf_TARGET_DIR])
+		for File in Batch:
+			Mine	= True
 
-			if self.__conf_SET_PERMISSIONS:
-				print(f'Setting permissions to {self.__conf_SET_PERMISSIONS} ...')
-				subprocess.run(['chmod', '-R', f"{self.__conf_SET_PERMISSIONS}", self.__conf_TARGET_DIR])
+			for Member in File.files():
+				if Member.Known:
+					continue
+
+				if (Member.FilePathName, Member.ModificationTime) in Archived:
+					# by another worker since the scan
+					Member.Known	= True
+				elif not (Member.FilePathName, Member.ModificationTime) in Claimed:
+					Mine	= False
+
+			if not Mine:
+				# the folder is left to the other worker
+				Scanner.mark_dirty(File.FilePathName)
+				continue
+
+			if not all(Member.Known for Member in File.files()):
+				yield(File)
+
+	def __renew_leases(self, Done):
+		while not Done.wait(self.__conf_LEASE_SEC / 3):
+			self.db.dbRenewLeases(self.__owner, self.__conf_LEASE_SEC)
+
+	def __stage_metadata(self, Item):
+		MediaFilePath	= Item.SourceFile.FilePathName
+
+		Item.fileobj	= lib_media.mediafile(MediaFilePath, self.__conf_RENAME_FILES, self.exiftool, self.__conf_METADATA_NATIVE, self.filename_patterns, strategy=self.__get_read_strategy(MediaFilePath))
+
+		# read here by the metadata workers, not by the single route worker
+		if self.router.NeedsCameraModel:
+			Item.fileobj.get_camera_model()
+
+		# only dedup compares quick hashes, the index gets missing ones when they are needed
+		if self.__conf_DEDUP:
+			for SourceFile in Item.SourceFile.files():
+				if SourceFile.Known:
+					continue
 
-			if self.__conf_EXEC_SCRIPT_IF_SUCCESS:
 				try:
-					subprocess.run(self.__conf_EXEC_SCRIPT_IF_SUCCESS, shell=True)
-				except:
-					print('Your script defined in conf_EXEC_SCRIPT_IF_SUCCESS raised an error.')
+					SourceFile.QuickHash	= lib_dedup.quick_hash(SourceFile.FilePathName)
+				except OSError:
+					pass
 
-		print ('\nFinished.')
+		return(Item)
+
+	def __get_read_strategy(self, MediaFilePath):
+		return(self.read_strategies.get(self.router.get_category(MediaFilePath)[0]))
+
+	def __stage_route(self, Item):
+		# runs in one thread in the order of the scan: decisions are the same as in a sequential run
+		# the other files of a group take the date of the authoritative member, sidecars also its folder
+		Jobs		= []
+		LeadPath	= None
+
+		self.__MetadataBytes	+= Item.fileobj.BytesRead
+
+		for SourceFile in Item.SourceFile.files():
+			if SourceFile is Item.SourceFile:
+				fileobj	= Item.fileobj
+			else:
+				fileobj	= self.__get_member_fileobj(SourceFile, Item.fileobj)
+
+			if LeadPath is None or not self.router.is_sidecar(SourceFile.FilePathName):
+				TargetPath	= self.__get_target_path(SourceFile.FilePathName, fileobj)
+			else:
+				TargetPath	= LeadPath
+
+			if LeadPath is None:
+				LeadPath	= TargetPath
+
+			# archived before, only the date was needed
+			if SourceFile.Known:
+				continue
+
+			Jobs.append(self.__route_file(SourceFile, fileobj, TargetPath))
+
+		Jobs[0].Group	= Jobs[1:]
+
+		return(Jobs[0])
+
+	def __get_member_fileobj(self, SourceFile, LeadFileobj):
+		# no metadata read
+		fileobj	= lib_media.mediafile(SourceFile.FilePathName, self.__conf_RENAME_FILES, self.exiftool, self.__conf_METADATA_NATIVE, self.filename_patterns, CaptureTime=LeadFileobj.get_capture_time())
+
+		fileobj.DateMethod		= LeadFileobj.DateMethod
+		fileobj.exifdate_exists	= LeadFileobj.exifdate_exists
+		fileobj.camera_model	= LeadFileobj.camera_model
+
+		return(fileobj)
+
+	def __route_file(self, SourceFile, fileobj, TargetPath):
+		MediaFilePath	= SourceFile.FilePathName
+
+		print(f"\nFile: {MediaFilePath}")
+
+		# FileName
+		TargetFileName	= fileobj.get_new_FileName()
+
+		# target file path and name
+		TargetFilePathName	= os.path.join(TargetPath, TargetFileName)
+
+		# files of this run may still be in transfer
+		Predecessor		= self.__TargetJobs.get(TargetFilePathName)
+		TargetExists	= (not Predecessor is None) or self.__TargetDirs.exists(TargetFilePathName)
+
+		DuplicateOf		= None
+		if not self.__dedup is None:
+			# same content at the target or earlier in this run
+			DuplicateOf, DuplicateJob	= self.__dedup.find(SourceFile)
+
+			if DuplicateOf is None and TargetExists and Predecessor is None and self.__dedup.same_content(SourceFile, TargetFilePathName):
+				DuplicateOf	= TargetFilePathName
+
+			if not DuplicateOf is None:
+				print(f"Duplicate of: {DuplicateOf}")
+
+				if self.__conf_DEDUP_ACTION == 'skip' or DuplicateOf == TargetFilePathName:
+					# nothing new at the target
+					Job	= lib_transfer.job(SourceFile, DuplicateOf, None, fileobj, DuplicateJob)
+					Job.DuplicateOf	= DuplicateOf
+					return(Job)
+
+				# a link never replaces another file, wait for the transfer of the file of this run
+				Predecessor		= DuplicateJob
+
+			if TargetExists:
+				# same name, different content: never overwritten
+				TargetFilePathName	= lib_dedup.distinct_name(TargetFilePathName, lambda Path: Path in self.__TargetJobs or self.__TargetDirs.exists(Path))
+				TargetExists		= False
+
+				print(f"Name taken, new name: {os.path.basename(TargetFilePathName)}")
+
+		# create target path
+		print(f"TargetPath: {TargetPath}")
+
+		if not self.__TargetDirs.isdir(TargetPath):
+			self.DirsCreated	+= 1
+			for CreatedDir in self.__TargetDirs.makedirs(TargetPath):
+				self.permissions.apply(CreatedDir)
+				self.__TouchedDirs.add(CreatedDir)
+
+		Job	= lib_transfer.job(SourceFile, TargetFilePathName, self.__TargetDirs.device(TargetPath), fileobj, Predecessor)
+		Job.DuplicateOf	= DuplicateOf
+
+		if not TargetExists or self.__conf_OVERWRITE:
+			self.__TargetJobs[TargetFilePathName]	= Job
+			self.__TargetDirs.add(TargetFilePathName)
+
+			if DuplicateOf is None and not self.__dedup is None:
+				self.__dedup.add(Job)
+
+			# existing folders receiving files
+			if not TargetPath in self.__TouchedDirs:
+				self.permissions.apply(TargetPath)
+				self.__TouchedDirs.add(TargetPath)
+		else:
+			# nothing to transfer, only to record
+			Job.Transfer	= False
+
+		return(Job)
+
+	def __get_target_path(self, MediaFilePath, fileobj):
+		TargetSubPath	= self.router.get_path(MediaFilePath, fileobj)
+
+		TargetPath	= os.path.join(self.__conf_TARGET_DIR, TargetSubPath) if TargetSubPath else self.__conf_TARGET_DIR
+
+		if os.path.commonpath([os.path.abspath(self.__conf_TARGET_DIR), os.path.abspath(TargetPath)]) != os.path.abspath(self.__conf_TARGET_DIR):
+			raise ValueError(f"target path '{TargetPath}' of '{MediaFilePath}' is outside of '{self.__conf_TARGET_DIR}'")
+
+		return(TargetPath)
+
+	def __stage_transfer(self, Job):
+		# the files of a group one after the other
+		for Member in [Job] + Job.Group:
+			if Member.Transfer and not self.__transfer.run(Member):
+				self.__scanner.mark_dirty(Member.SourceFile.FilePathName)
+
+		return(Job)
+
+	def __stage_record(self, Job):
+		for Member in [Job] + Job.Group:
+			# failed transfers are tried again by the next run
+			if not Member.Transfer or Member.Success:
+				self.__record_file(Member)
+
+	def __record_file(self, Job):
+		self.db.dbInsertMediaFile(Job.SourceFile.FilePathName, Job.SourceFile.ModificationTime, Job.Checksum)
+
+		# counted when done: failed and dropped transfers are not in the report
+		if Job.Transfer:
+			if Job.DuplicateOf is None:
+				self.FilesProcessed	+= 1
+			else:
+				self.FilesDuplicate	+= 1
+
+		TargetSubPath	= os.path.dirname(Job.TargetFilePathName).replace(self.__conf_TARGET_DIR, '', 1).strip('/')
+		if TargetSubPath not in self.FilesAtTarget.keys():
+			self.FilesAtTarget[TargetSubPath]	= []
+		self.FilesAtTarget[TargetSubPath].append(os.path.basename(Job.SourceFile.FilePathName))
+
+		if Job.Transfer and Job.DuplicateOf is None and not Job.fileobj.exifdate_exists:
+			self.__createdates.add(Job.TargetFilePathName, Job.fileobj)
+
+		# landed at the target: can be found as duplicate from now on
+		if Job.Transfer and Job.TargetFilePathName != Job.DuplicateOf and not self.index is None:
+			if Job.fileobj.exifdate_exists:
+				QuickHash	= Job.SourceFile.QuickHash
+				Hash		= Job.Checksum
+				if Hash is None and not self.__dedup is None:
+					Hash	= self.__dedup.known_hash(Job.SourceFile.FilePathName)
+			else:
+				# the create date was written into the target file: hashes of the source do not match any more
+				QuickHash, Hash	= None, None
+
+			try:
+				Stat	= os.stat(Job.TargetFilePathName)
+			except OSError:
+				return
+
+			# the date is kept for --resort
+			self.index.dbAddTargetFile(Job.TargetFilePathName, Job.SourceFile.Size, QuickHash, Hash, Job.fileobj.get_capture_time(), Job.fileobj.DateMethod, Stat.st_ino, Stat.st_mtime)
+
+	def __open_index(self):
+		return(lib_database.targetindex(
+			self.index_path,
+			self.__conf_DB_JOURNAL_MODE,
+			self.__conf_DB_SYNCHRONOUS,
+			self.__conf_DB_COMMIT_FILES,
+			self.__conf_DB_COMMIT_SEC,
+			60 if self.__conf_MULTI_WORKER else 5
+		))
+
+	def index_target(self):
+		# (re)builds the index of all media files at the target, hashes are calculated when needed
+		print(f"Indexing all media files in {self.__conf_TARGET_DIR} ...")
+
+		Index	= self.__open_index()
+
+		Files	= 0
+		for TargetFile in lib_scan.scanner(self.__conf_TARGET_DIR, self.media_extensions).scan():
+			Index.dbIndexTargetFile(TargetFile)
+			Files	+= 1
+
+		Index.dbClose()
+
+		print(f'{Files} files indexed.')
+
+	def resort(self):
+		# moves all files at the target into the current layout by renaming them, dates known by the index are not read again
+		print(f"Sorting all media files in {self.__conf_TARGET_DIR} into the current layout ...")
+
+		self.exiftool	= lib_exiftool.pool(self.__conf_EXIFTOOL_WORKERS, self.__conf_EXIFTOOL_TIMEOUT_SEC)
+		Index			= self.__open_index()
+		TargetDirs		= lib_targetdirs.targetdirs()
+
+		FilesCached, FilesRead, FilesMoved, FilesFailed	= 0, 0, 0, 0
+		LeftDirs	= set()
+
+		try:
+			for TargetFile in lib_scan.scanner(self.__conf_TARGET_DIR, self.media_extensions).scan():
+				MediaFilePath	= TargetFile.FilePathName
+
+				Cached	= Index.dbGetCaptureTime(TargetFile)
+				fileobj	= lib_media.mediafile(MediaFilePath, self.__conf_RENAME_FILES, self.exiftool, self.__conf_METADATA_NATIVE, self.filename_patterns, None if Cached is None else Cached[1], self.__get_read_strategy(MediaFilePath))
+
+				if Cached is None:
+					FilesRead	+= 1
+					Index.dbAddTargetFile(MediaFilePath, TargetFile.Size, None, None, fileobj.get_capture_time(), fileobj.DateMethod, TargetFile.Inode, TargetFile.ModificationTime)
+				else:
+					FilesCached	+= 1
+					if Cached[0] != MediaFilePath:
+						# renamed by someone else
+						Index.dbAddTargetFile(MediaFilePath, TargetFile.Size, None, None, Cached[1], Cached[2], TargetFile.Inode, TargetFile.ModificationTime)
+
+				try:
+					NewTargetPath	= self.__get_target_path(MediaFilePath, fileobj)
+				except ValueError as e:
+					print(f"Can not re-sort '{MediaFilePath}': {e}", file=sys.stderr)
+					FilesFailed	+= 1
+					continue
+
+				NewFilePathName		= os.path.join(NewTargetPath, fileobj.get_new_FileName())
+
+				if NewFilePathName == MediaFilePath:
+					continue
+
+				if TargetDirs.exists(NewFilePathName):
+					NewFilePathName	= lib_dedup.distinct_name(NewFilePathName, TargetDirs.exists)
+
+				if not TargetDirs.isdir(NewTargetPath):
+					for CreatedDir in TargetDirs.makedirs(NewTargetPath):
+						self.permissions.apply(CreatedDir)
+
+				try:
+					os.rename(MediaFilePath, NewFilePathName)
+				except OSError as e:
+					print(f"Can not move '{MediaFilePath}' to '{NewFilePathName}': {e}", file=sys.stderr)
+					FilesFailed	+= 1
+					continue
+
+				print(f"'{MediaFilePath}' -> '{NewFilePathName}'")
+
+				Index.dbMoveTargetFile(MediaFilePath, NewFilePathName)
+				TargetDirs.remove(MediaFilePath)
+				TargetDirs.add(NewFilePathName)
+
+				LeftDirs.add(os.path.dirname(MediaFilePath))
+				FilesMoved	+= 1
+
+		finally:
+			self.exiftool.close()
+			Index.dbClose()
+			self.permissions.flush()
+
+		# remove folders left empty, deepest first
+		for DirPath in sorted(LeftDirs, reverse=True):
+			try:
+				os.removedirs(DirPath)
+			except OSError:
+				pass
+
+		print(f'{FilesMoved} files moved, {FilesFailed} failed. Dates of {FilesCached} files known by the index, {FilesRead} files read.')
+
+	def repair_permissions(self):
+		if not self.permissions.configured():
+			sys.exit('Please define conf_SET_USER and conf_SET_GROUP or conf_SET_PERMISSIONS.')
+
+		print(f"Setting ownership '{self.__conf_SET_USER}:{self.__conf_SET_GROUP}' and permissions '{self.__conf_SET_PERMISSIONS}' of all files in {self.__conf_TARGET_DIR} ...")
+		self.permissions.apply_tree(self.__conf_TARGET_DIR)
+
+		print('All done.')
 
 	def clean(self):
 		if self.__conf_SOURCE_DIR in ['', '/']:
@@ -277,27 +867,148 @@ class archivist(object):
 
 			print('All done.')
 
+class orchestrator(object):
+	# several configs in one process, one after the other: one exiftool pool, one set of device limits and one mail for all
+	# the shared settings are taken from the first config
+
+	def __init__(self, ConfigFilePaths):
+		self.ConfigFilePaths	= ConfigFilePaths
+
+		self.__setup	= lib_setup.setup(ConfigFilePaths[0])
+
+		self.exiftool	= lib_exiftool.pool(self.__setup.get_val('conf_EXIFTOOL_WORKERS'), self.__setup.get_val('conf_EXIFTOOL_TIMEOUT_SEC'))
+		self.limits		= lib_transfer.devicelimits(self.__setup.get_val('conf_TRANSFER_SOURCE_DEVICE_LIMIT'), self.__setup.get_val('conf_TRANSFER_TARGET_DEVICE_LIMIT'))
+
+	def run(self):
+		# [(ConfigFilePath, FilesProcessed, DirsCreated, FilesAtTarget), ...]
+		Reports	= []
+
+		try:
+			for ConfigFilePath in self.ConfigFilePaths:
+				print(f'\nConfig: {ConfigFilePath}')
+
+				try:
+					Archivist	= archivist(ConfigFilePath, self.exiftool, self.limits)
+				except SystemExit as e:
+					# not configured or already working: the other sources go on
+					print(f"{ConfigFilePath}: {e}", file=sys.stderr)
+					continue
+
+				Archivist.SendMail	= False
+
+				try:
+					Archivist.run()
+				except Exception as e:
+					print(f"{ConfigFilePath}: {e}", file=sys.stderr)
+				finally:
+					# the lock of the source is released, also if a traceback still refers to the archivist
+					Archivist.close()
+
+				FilesProcessed, DirsCreated, FilesAtTarget	= Archivist.Report
+				if (FilesProcessed > 0) or (DirsCreated > 0):
+					Reports.append((ConfigFilePath, FilesProcessed, DirsCreated, FilesAtTarget))
+
+		finally:
+			self.exiftool.close()
+
+		if Reports:
+			send_report(self.__setup, f'archivist: {len(Reports)} of {len(self.ConfigFilePaths)} sources', Reports)
+
+def send_report(Setup, Subject, Reports):
+	# Reports: [(Title or None, FilesProcessed, DirsCreated, FilesAtTarget), ...], one mail for all
+	mail	= lib_mail.mail(Setup)
+
+	if not mail.mail_configured():
+		return
+
+	mail_text_plain	= ''
+	mail_text_html	= ''
+
+	for Title, FilesProcessed, DirsCreated, FilesAtTarget in Reports:
+		if not Title is None:
+			mail_text_plain	+= f"\n\n{Title}\n"
+			mail_text_html	+= f"\n<h2>{Title}</h2>"
+
+		mail_text_plain	+= f"""
+ * {FilesProcessed} files processed.
+ * {DirsCreated} new folders created.
+		"""
+
+		for TargetSubPath in FilesAtTarget.keys():
+			mail_text_plain	+= f"\n\n{TargetSubPath}"
+
+			for FileName in FilesAtTarget[TargetSubPath]:
+				mail_text_plain	+= f"\n - {FileName}"
+
+		mail_text_html	+= f"""
+<ul>
+	<li>{FilesProcessed} files processed.</li>
+	<li>{DirsCreated} new folders created.</li>
+</ul>
+		"""
+		for TargetSubPath in FilesAtTarget.keys():
+			mail_text_html	+= f"<h3>{TargetSubPath}</h3>"
+
+			mail_text_html	+= "\n<ul>"
+			for FileName in FilesAtTarget[TargetSubPath]:
+				mail_text_html	+= f"\n<li>{FileName}</li>"
+			mail_text_html	+= "\n</ul>"
+
+	mail.sendmail(Subject=Subject, TextPlain=mail_text_plain, TextHTML=mail_text_html)
 
 if __name__ == "__main__":
-	ConfigFilePath	= ''
+	ConfigFilePaths	= []
 	CleanUp			= False
+	RepairPermissions	= False
+	IndexTarget		= False
+	Resort			= False
+	Watch			= False
 
 	for arg in sys.argv:
 		# --config=...
 		if arg[0:9] == '--config=':
-			try:
-				ConfigFilePath	= arg.split('=',1)[1]
-			except:
-				pass
+			ConfigFilePath	= arg.split('=',1)[1].strip(" '")
 
-			ConfigFilePath	= ConfigFilePath.strip(" '")
+			# a folder of configs
+			if os.path.isdir(ConfigFilePath):
+				ConfigFilePaths	+= sorted(os.path.join(ConfigFilePath, FileName) for FileName in os.listdir(ConfigFilePath) if FileName.endswith('.conf'))
+			elif ConfigFilePath:
+				ConfigFilePaths.append(ConfigFilePath)
 		elif arg == '--clean':
 			CleanUp	= True
-
-	if not ConfigFilePath:
+		elif arg == '--repair-permissions':
+			RepairPermissions	= True
+		elif arg == '--index-target':
+			IndexTarget	= True
+		elif arg == '--resort':
+			Resort	= True
+		elif arg == '--watch':
+			Watch	= True
+
+	# terminate by SystemExit to close the database cleanly
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit('archivist terminated.'))
+
+	if not ConfigFilePaths:
 		sys.exit('Please define a config file (existing or to create) by argument --config=/abc/archivist.conf')
 
+	if len(ConfigFilePaths) > 1:
+		if CleanUp or RepairPermissions or IndexTarget or Resort or Watch:
+			sys.exit('Several configs can only be archived, the other options take one config.')
+
+		orchestrator(ConfigFilePaths).run()
+		sys.exit()
+
+	ConfigFilePath	= ConfigFilePaths[0]
+
 	if CleanUp:
 		archivist(ConfigFilePath).clean()
+	elif RepairPermissions:
+		archivist(ConfigFilePath).repair_permissions()
+	elif IndexTarget:
+		archivist(ConfigFilePath).index_target()
+	elif Resort:
+		archivist(ConfigFilePath).resort()
+	elif Watch:
+		archivist(ConfigFilePath).watch()
 	else:
 		archivist(ConfigFilePath).run()
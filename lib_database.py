@@ -20,20 +20,54 @@
 import os
 import sqlite3
 import subprocess
+import sys
+import threading
+import time
 
+# databases up to this size are loaded into memory to look up known files
+KNOWN_PRELOAD_MAX_ROWS	= 200000
+
+# number of paths per query if the database is larger
+KNOWN_QUERY_BATCH_SIZE	= 500
+
+
+JOURNAL_MODES	= ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF']
+SYNCHRONOUS		= ['OFF', 'NORMAL', 'FULL', 'EXTRA']
 
 class database(object):
-	def __init__(self, db_path):
+	def __init__(self, db_path, JournalMode='WAL', Synchronous='NORMAL', CommitFiles=500, CommitSec=5, BusyTimeoutSec=5):
 
 
 		self.db_path	= db_path
 
-		self.__con	= sqlite3.connect(self.db_path)
+		# inserted media files are committed in groups
+		self.CommitFiles	= max(1, CommitFiles)
+		self.CommitSec		= CommitSec
+
+		self.__pending			= 0
+		self.__pending_since	= 0
+
+		# set of known (SourcePath, ModificationTime) if preloaded, False if too large
+		self.__known	= None
+
+		# the connection is shared by the threads of the pipeline
+		self.__lock	= threading.RLock()
+
+		# BusyTimeoutSec: how long to wait for other processes writing to the database
+		self.__con	= sqlite3.connect(self.db_path, timeout=BusyTimeoutSec, check_same_thread=False)
 		self.__cur	= self.__con.cursor()
 
+		JournalMode	= JournalMode.upper()
+		if JournalMode in JOURNAL_MODES:
+			self.__cur.execute(f"pragma journal_mode={JournalMode};")
+
+		Synchronous	= Synchronous.upper()
+		if Synchronous in SYNCHRONOUS:
+			self.__cur.execute(f"pragma synchronous={Synchronous};")
+
 		self.__dbUpgrade()
 
-	def __dbUpgrade(self):
+	def dbGetCreateArray(self):
 		# define database, append lines for updates, do not change existing lines!
 		dbCreateArray	= []
 
@@ -45,8 +79,21 @@ class database(object):
 		dbCreateArray.append("alter table mediafiles add column ModificationTime TIMESTAMP;")
 		dbCreateArray.append("drop index SourcePath_idx;")
 		dbCreateArray.append("create unique index MediaSource_idx on mediafiles(SourcePath, ModificationTime);")
+		dbCreateArray.append("create table sourcedirs (DirPath text primary key, ModificationTime TIMESTAMP, EntryCount integer);")
+		dbCreateArray.append("alter table CONFIG add column LastFullScan TIMESTAMP;")
+		dbCreateArray.append("alter table mediafiles add column Checksum text;")
+		dbCreateArray.append("create table transfers (SourcePath text primary key, ModificationTime TIMESTAMP, Size integer, TempPath text, Offset integer);")
+		dbCreateArray.append("create table leases (SourcePath text primary key, Owner text, Expires TIMESTAMP);")
 		#dbCreateArray.append("alter table mediafiles add column ... text;")
 
+		return(dbCreateArray)
+
+	def __dbUpgrade(self):
+		dbCreateArray	= self.dbGetCreateArray()
+
+		# one process at a time, others wait and find the database upgraded
+		self.__cur.execute("begin immediate;")
+
 		# try to get version of existing db
 		dbVersion	= -1
 		if os.path.isfile(self.db_path):
@@ -70,29 +117,249 @@ class database(object):
 
 			self.dbExecute(f"update CONFIG set VERSION = {i};")
 
-	def dbExecute(self,Command):
-		try:
-			self.__cur.execute(Command)
-			self.__con.commit()
+		self.__con.commit()
+
+	def dbExecute(self,Command,Parameters=()):
+		with self.__lock:
+			try:
+				self.__cur.execute(Command,Parameters)
+				self.__con.commit()
+				self.__pending	= 0
+				return(True)
+			except:
+				return(False)
+
+	def dbExecuteMany(self,Command,ParametersList):
+		with self.__lock:
+			try:
+				self.__cur.executemany(Command,ParametersList)
+				self.__con.commit()
+				self.__pending	= 0
+				return(True)
+			except:
+				return(False)
+
+	def dbSelect(self,Command,Parameters=()):
+		with self.__lock:
+			try:
+				return(self.__cur.execute(Command,Parameters).fetchall())
+			except:
+				return(False)
+
+	def dbMediaFileKnown(self, FilePath, ModificationTime):
+		return((FilePath, ModificationTime) in self.dbMediaFilesKnown([(FilePath, ModificationTime)]))
+
+	def dbMediaFilesKnown(self, Files):
+		# Files: [(SourcePath, ModificationTime), ...], returns the set of those already archived
+		if self.__known is None:
+			Rows	= self.dbSelect("select count(*) from mediafiles;")
+			if Rows and Rows[0][0] <= KNOWN_PRELOAD_MAX_ROWS:
+				# small database: one query for the whole run
+				Rows	= self.dbSelect("select SourcePath, ModificationTime from mediafiles;")
+				self.__known	= set(Rows) if Rows else set()
+			else:
+				self.__known	= False
+
+		if self.__known is not False:
+			return(set(File for File in Files if File in self.__known))
+
+		Known	= set()
+		Paths	= list(set(FilePath for FilePath, ModificationTime in Files))
+
+		for i in range(0, len(Paths), KNOWN_QUERY_BATCH_SIZE):
+			Batch	= Paths[i:i + KNOWN_QUERY_BATCH_SIZE]
+			Rows	= self.dbSelect(f"select SourcePath, ModificationTime from mediafiles where SourcePath in ({','.join('?' * len(Batch))});", Batch)
+			if Rows:
+				Known.update(Rows)
+
+		return(set(File for File in Files if File in Known))
+
+	def dbClaimMediaFiles(self, Files, Owner, LeaseSec):
+		# multi-worker mode, Files: [(SourcePath, ModificationTime), ...]
+		# returns (claimed, archived), claimed: files leased by Owner now, archived: files already archived (by another worker)
+		with self.__lock:
+			Now	= time.time()
+
+			try:
+				# pending records first: the claim is a transaction of its own
+				self.__con.commit()
+				self.__pending	= 0
+
+				self.__cur.execute("begin immediate;")
+
+				self.__cur.execute("delete from leases where Expires < ?;", (Now,))
+				self.__cur.execute("update leases set Expires = ? where Owner = ?;", (Now + LeaseSec, Owner))
+				self.__cur.executemany("insert or ignore into leases (SourcePath, Owner, Expires) values (?, ?, ?);", [(SourcePath, Owner, Now + LeaseSec) for SourcePath, ModificationTime in Files])
+
+				Claimed		= set()
+				Archived	= set()
+
+				Paths	= list(set(SourcePath for SourcePath, ModificationTime in Files))
+				for i in range(0, len(Paths), KNOWN_QUERY_BATCH_SIZE):
+					Batch	= Paths[i:i + KNOWN_QUERY_BATCH_SIZE]
+					Marks	= ','.join('?' * len(Batch))
+
+					Claimed.update(Row[0] for Row in self.__cur.execute(f"select SourcePath from leases where Owner = ? and SourcePath in ({Marks});", [Owner] + Batch).fetchall())
+					Archived.update(self.__cur.execute(f"select SourcePath, ModificationTime from mediafiles where SourcePath in ({Marks});", Batch).fetchall())
+
+				self.__con.commit()
+
+			except sqlite3.Error as e:
+				print(f"Can not claim files: {e}", file=sys.stderr)
+				self.__con.rollback()
+				return(set(), set())
+
+			Archived	= set(File for File in Files if File in Archived)
+
+			if isinstance(self.__known, set):
+				self.__known.update(Archived)
+
+			return(set(File for File in Files if File[0] in Claimed), Archived)
+
+	def dbRenewLeases(self, Owner, LeaseSec):
+		return(self.dbExecute("update leases set Expires = ? where Owner = ?;", (time.time() + LeaseSec, Owner)))
+
+	def dbReleaseLeases(self, Owner):
+		return(self.dbExecute("delete from leases where Owner = ?;", (Owner,)))
+
+	def dbExecutePending(self,Command,Parameters=()):
+		# committed in groups by dbCommitPending or dbFlush
+		with self.__lock:
+			try:
+				self.__cur.execute(Command,Parameters)
+			except:
+				return(False)
+
+			if not self.__pending:
+				self.__pending_since	= time.time()
+			self.__pending	+= 1
+
+			self.dbCommitPending()
 			return(True)
-		except:
-			return(False)
 
-	def dbSelect(self,Command):
+	def dbInsertMediaFile(self,SourcePath, ModificationTime, Checksum=None):
+		#insert data
+		if self.dbExecutePending("insert into mediafiles (SourcePath, ModificationTime, Checksum) values (?, ?, ?);", (SourcePath, ModificationTime, Checksum)):
+			if isinstance(self.__known, set):
+				self.__known.add((SourcePath, ModificationTime))
+
+	def dbCommitPending(self):
+		# commit if enough files are waiting or the oldest one waits too long
+		with self.__lock:
+			if self.__pending and ((self.__pending >= self.CommitFiles) or (time.time() - self.__pending_since >= self.CommitSec)):
+				self.dbFlush()
+
+	def dbFlush(self):
+		with self.__lock:
+			try:
+				self.__con.commit()
+			except:
+				return(False)
+
+			self.__pending	= 0
+			return(True)
+
+	def dbClose(self):
+		self.dbFlush()
+		self.__con.close()
+
+	def dbGetSourceDirs(self):
+		# returns {DirPath: (ModificationTime, EntryCount)}
+		Rows	= self.dbSelect("select DirPath, ModificationTime, EntryCount from sourcedirs;")
+
+		return({Row[0]: (Row[1], Row[2]) for Row in Rows} if Rows else {})
+
+	def dbSetSourceDirs(self, SourceDirs, Replace=False):
+		# SourceDirs: {DirPath: (ModificationTime, EntryCount)}
+		if Replace:
+			self.dbExecute("delete from sourcedirs;")
+
+		self.dbExecuteMany(
+			"insert or replace into sourcedirs (DirPath, ModificationTime, EntryCount) values (?, ?, ?);",
+			[(DirPath, ModificationTime, EntryCount) for DirPath, (ModificationTime, EntryCount) in SourceDirs.items()]
+		)
+
+	def dbGetLastFullScan(self):
+		Rows	= self.dbSelect("select LastFullScan from CONFIG;")
+
 		try:
-			return(self.__cur.execute(Command).fetchall())
+			return(float(Rows[0][0] or 0))
 		except:
-			return(False)
+			return(0)
 
-	def dbMediaFileKnown(self, FilePath, ModificationTime):
-		return(self.dbSelect(f"select SourcePath from mediafiles where SourcePath='{FilePath}' and ModificationTime={ModificationTime}"))
+	def dbSetLastFullScan(self, Time):
+		self.dbExecute("update CONFIG set LastFullScan = ?;", (Time,))
 
+	# journal of resumable transfers, committed at once
+	def dbGetTransfer(self, SourcePath):
+		# returns (TempPath, Offset, ModificationTime, Size) of an interrupted transfer of the file or None
+		Rows	= self.dbSelect("select TempPath, Offset, ModificationTime, Size from transfers where SourcePath = ?;", (SourcePath,))
+		return(Rows[0] if Rows else None)
 
-	def dbInsertMediaFile(self,SourcePath, ModificationTime):
-		#insert data
-		Command	= f"insert into mediafiles (SourcePath, ModificationTime) values ('{SourcePath}', {ModificationTime});"
+	def dbSetTransfer(self, SourcePath, ModificationTime, Size, TempPath, Offset):
+		self.dbExecute("insert or replace into transfers (SourcePath, ModificationTime, Size, TempPath, Offset) values (?, ?, ?, ?, ?);", (SourcePath, ModificationTime, Size, TempPath, Offset))
+
+	def dbRemoveTransfer(self, SourcePath):
+		self.dbExecute("delete from transfers where SourcePath = ?;", (SourcePath,))
+
+class targetindex(database):
+	# files at the target by size and content hashes, stored in the target directory
+
+	def dbGetCreateArray(self):
+		# define database, append lines for updates, do not change existing lines!
+		dbCreateArray	= []
+
+		dbCreateArray.append("create table CONFIG (VERSION integer);")
+		dbCreateArray.append("insert into CONFIG (VERSION) values (0);")
+		dbCreateArray.append("create table targetfiles (ID integer primary key autoincrement, TargetPath text, Size integer, QuickHash text, Hash text);")
+		dbCreateArray.append("create unique index TargetPath_idx on targetfiles(TargetPath);")
+		dbCreateArray.append("create index Size_idx on targetfiles(Size);")
+		dbCreateArray.append("alter table targetfiles add column CaptureTime text;")
+		dbCreateArray.append("alter table targetfiles add column DateMethod text;")
+		dbCreateArray.append("alter table targetfiles add column Inode integer;")
+		dbCreateArray.append("alter table targetfiles add column ModificationTime TIMESTAMP;")
+		dbCreateArray.append("create index Inode_idx on targetfiles(Inode);")
+
+		return(dbCreateArray)
+
+	def dbGetTargetFilesBySize(self, Size):
+		# returns [(TargetPath, QuickHash, Hash, Inode, ModificationTime), ...]
+		Rows	= self.dbSelect("select TargetPath, QuickHash, Hash, Inode, ModificationTime from targetfiles where Size = ?;", (Size,))
+		return(Rows if Rows else [])
+
+	def dbAddTargetFile(self, TargetPath, Size, QuickHash=None, Hash=None, CaptureTime=None, DateMethod=None, Inode=None, ModificationTime=None):
+		self.dbExecutePending("insert or replace into targetfiles (TargetPath, Size, QuickHash, Hash, CaptureTime, DateMethod, Inode, ModificationTime) values (?, ?, ?, ?, ?, ?, ?, ?);", (TargetPath, Size, QuickHash, Hash, CaptureTime, DateMethod, Inode, ModificationTime))
+
+	def dbGetCaptureTime(self, TargetFile):
+		# cached date of an unchanged file, found by its path or, if renamed, by its inode
+		# returns (TargetPath, CaptureTime, DateMethod) or None
+		Identity	= (TargetFile.Size, TargetFile.Inode, TargetFile.ModificationTime)
+
+		Rows	= self.dbSelect("select TargetPath, CaptureTime, DateMethod, Size, Inode, ModificationTime from targetfiles where TargetPath = ?;", (TargetFile.FilePathName,))
+		if Rows and Rows[0][1] and tuple(Rows[0][3:]) == Identity:
+			return(tuple(Rows[0][:3]))
+
+		Rows	= self.dbSelect("select TargetPath, CaptureTime, DateMethod from targetfiles where Inode = ? and Size = ? and ModificationTime = ? and CaptureTime is not null;", (TargetFile.Inode, TargetFile.Size, TargetFile.ModificationTime))
+		return(tuple(Rows[0]) if Rows else None)
+
+	def dbIndexTargetFile(self, TargetFile):
+		# keeps hashes and date of unchanged files
+		self.dbExecutePending("""insert into targetfiles (TargetPath, Size, Inode, ModificationTime) values (?, ?, ?, ?)
+			on conflict(TargetPath) do update set Size = excluded.Size, Inode = excluded.Inode, ModificationTime = excluded.ModificationTime, QuickHash = null, Hash = null, CaptureTime = null, DateMethod = null
+			where Size is not excluded.Size or Inode is not excluded.Inode or ModificationTime is not excluded.ModificationTime;""", (TargetFile.FilePathName, TargetFile.Size, TargetFile.Inode, TargetFile.ModificationTime))
+
+	def dbSetTargetFileStat(self, TargetPath, Stat):
+		# the file was changed after it was added
+		self.dbExecutePending("update targetfiles set Size = ?, Inode = ?, ModificationTime = ?, QuickHash = null, Hash = null where TargetPath = ?;", (Stat.st_size, Stat.st_ino, Stat.st_mtime, TargetPath))
+
+	def dbMoveTargetFile(self, TargetPath, NewTargetPath):
+		self.dbExecutePending("update or replace targetfiles set TargetPath = ? where TargetPath = ?;", (NewTargetPath, TargetPath))
+
+	def dbSetTargetFileHashes(self, TargetPath, QuickHash, Hash=None):
+		self.dbExecutePending("update targetfiles set QuickHash = ?, Hash = coalesce(?, Hash) where TargetPath = ?;", (QuickHash, Hash, TargetPath))
 
-		self.dbExecute(Command)
+	def dbRemoveTargetFile(self, TargetPath):
+		self.dbExecutePending("delete from targetfiles where TargetPath = ?;", (TargetPath,))
 
 if __name__ == "__main__":
 	pass
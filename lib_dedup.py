@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Finds files with the same content at the target: same size, same quick hash (head and tail), same full hash
+
+import hashlib
+import os
+import stat
+import sys
+
+# bytes read from the start and from the end of a file for the quick hash
+QUICK_HASH_CHUNK	= 65536
+
+HASH_BLOCK_SIZE		= 1048576
+
+DEDUP_ACTIONS	= ['skip', 'hardlink']
+
+def quick_hash(FilePathName):
+	# cheap prefilter: size, first and last chunk
+	Hash	= hashlib.blake2b(digest_size=16)
+
+	with open(FilePathName, 'rb') as f:
+		Size	= os.fstat(f.fileno()).st_size
+		Hash.update(str(Size).encode())
+
+		Hash.update(f.read(QUICK_HASH_CHUNK))
+
+		if Size > 2 * QUICK_HASH_CHUNK:
+			f.seek(-QUICK_HASH_CHUNK, os.SEEK_END)
+			Hash.update(f.read(QUICK_HASH_CHUNK))
+		elif Size > QUICK_HASH_CHUNK:
+			Hash.update(f.read())
+
+	return(Hash.hexdigest())
+
+def full_hash(FilePathName):
+	# same as the checksums of verified transfers
+	Hash	= hashlib.blake2b()
+
+	with open(FilePathName, 'rb') as f:
+		while True:
+			Block	= f.read(HASH_BLOCK_SIZE)
+			if not Block:
+				break
+
+			Hash.update(Block)
+
+	return(Hash.hexdigest())
+
+def distinct_name(TargetFilePathName, Exists=os.path.lexists):
+	# name_1.ext, name_2.ext, ... for which Exists(name) is False
+	Name, Ext	= os.path.splitext(TargetFilePathName)
+
+	i	= 0
+	while True:
+		i	+= 1
+		Candidate	= f'{Name}_{i}{Ext}'
+
+		if not Exists(Candidate):
+			return(Candidate)
+
+class dedup(object):
+	# used by the route stage only
+
+	def __init__(self, Index=None):
+		# lib_database.targetindex or None
+		self.Index	= Index
+
+		# full hashes of this run: {FilePathName: Hash}
+		self.__hashes	= {}
+
+		# files transferred by this run: {Size: [Job, ...]}
+		self.__run		= {}
+
+	def get_quick_hash(self, SourceFile):
+		if SourceFile.QuickHash is None:
+			SourceFile.QuickHash	= quick_hash(SourceFile.FilePathName)
+
+		return(SourceFile.QuickHash)
+
+	def get_hash(self, FilePathName):
+		if not FilePathName in self.__hashes:
+			self.__hashes[FilePathName]	= full_hash(FilePathName)
+
+		return(self.__hashes[FilePathName])
+
+	def known_hash(self, FilePathName):
+		return(self.__hashes.get(FilePathName))
+
+	def find(self, SourceFile):
+		# returns the target file or the job of this run with the same content, (None, None) if there is none
+		try:
+			QuickHash	= self.get_quick_hash(SourceFile)
+
+			# files of this run, not necessarily landed yet
+			for Job in self.__run.get(SourceFile.Size, []):
+				if Job.SourceFile.QuickHash == QuickHash and self.__same_as_job(SourceFile, Job):
+					return(Job.TargetFilePathName, Job)
+
+			if not self.Index is None:
+				TargetPath	= self.__find_in_index(SourceFile, QuickHash)
+				if not TargetPath is None:
+					return(TargetPath, None)
+
+		except OSError as e:
+			print(f"Can not check '{SourceFile.FilePathName}' for duplicates: {e}", file=sys.stderr)
+
+		return(None, None)
+
+	def same_content(self, SourceFile, TargetFilePathName):
+		# for name collisions with files not in the index
+		try:
+			if os.path.getsize(TargetFilePathName) != SourceFile.Size:
+				return(False)
+
+			if quick_hash(TargetFilePathName) != self.get_quick_hash(SourceFile):
+				return(False)
+
+			return(self.get_hash(TargetFilePathName) == self.get_hash(SourceFile.FilePathName))
+
+		except OSError:
+			return(False)
+
+	def add(self, Job):
+		# a file of this run going to the target
+		self.__run.setdefault(Job.SourceFile.Size, []).append(Job)
+
+	def __same_as_job(self, SourceFile, Job):
+		try:
+			OtherHash	= self.get_hash(Job.SourceFile.FilePathName)
+		except OSError:
+			# moved away in the meantime: compare with its target
+			# a job not taken by a transfer worker yet may wait in the sort window of the route stage calling this
+			if not Job.Started:
+				return(False)
+
+			Job.Done.wait()
+			if not Job.Success:
+				return(False)
+
+			OtherHash	= self.get_hash(Job.TargetFilePathName)
+
+		return(OtherHash == self.get_hash(SourceFile.FilePathName))
+
+	def __find_in_index(self, SourceFile, QuickHash):
+		for TargetPath, TargetQuickHash, TargetHash, Inode, ModificationTime in self.Index.dbGetTargetFilesBySize(SourceFile.Size):
+			try:
+				Stat	= os.stat(TargetPath)
+			except OSError:
+				Stat	= None
+
+			if Stat is None or not stat.S_ISREG(Stat.st_mode):
+				self.Index.dbRemoveTargetFile(TargetPath)
+				continue
+
+			if (Stat.st_size, Stat.st_ino, Stat.st_mtime) != (SourceFile.Size, Inode, ModificationTime):
+				# changed or replaced since it was indexed: the stored hashes are not valid
+				self.Index.dbSetTargetFileStat(TargetPath, Stat)
+				if Stat.st_size != SourceFile.Size:
+					continue
+
+				TargetQuickHash, TargetHash	= None, None
+
+			# hashes are calculated when they are needed the first time
+			if TargetQuickHash is None:
+				TargetQuickHash	= quick_hash(TargetPath)
+				self.Index.dbSetTargetFileHashes(TargetPath, TargetQuickHash)
+
+			if TargetQuickHash != QuickHash:
+				continue
+
+			if TargetHash is None:
+				TargetHash	= self.get_hash(TargetPath)
+				self.Index.dbSetTargetFileHashes(TargetPath, TargetQuickHash, TargetHash)
+
+			if TargetHash == self.get_hash(SourceFile.FilePathName):
+				return(TargetPath)
+
+		return(None)
+
+if __name__ == "__main__":
+	for FilePathName in sys.argv[1:]:
+		print(f"{quick_hash(FilePathName)} {full_hash(FilePathName)} {FilePathName}")
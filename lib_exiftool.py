@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Keeps long-living 'exiftool -stay_open True -@ -' processes and hands out commands to them
+
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+
+class worker(object):
+
+	def __init__(self, Timeout=30):
+		self.Timeout	= Timeout
+
+		self.__proc		= None
+		self.__count	= 0
+
+		# bytes read by the commands of this worker, Linux only
+		self.BytesRead	= 0
+
+	def start(self):
+		self.__proc	= subprocess.Popen(
+			['exiftool', '-stay_open', 'True', '-@', '-'],
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.DEVNULL
+		)
+
+	def running(self):
+		return(not self.__proc is None and self.__proc.poll() is None)
+
+	def stop(self):
+		if self.__proc is None:
+			return
+
+		try:
+			self.__proc.stdin.write(b'-stay_open\nFalse\n')
+			self.__proc.stdin.flush()
+			self.__proc.wait(timeout=5)
+		except:
+			self.kill()
+
+		self.__proc	= None
+
+	def kill(self):
+		if self.__proc is None:
+			return
+
+		try:
+			self.__proc.kill()
+			self.__proc.wait(timeout=5)
+		except:
+			pass
+
+		self.__proc	= None
+
+	def execute(self, Args):
+		# returns the output of exiftool as text, raises an exception if the worker died or timed out
+		return(self.execute_many([Args])[0])
+
+	def execute_many(self, ArgsList):
+		# sends all commands at once, returns their outputs as list, the timeout applies to each command
+		# the output of all commands has to fit into the pipe, exiftool stops reading while it can not write
+
+		if not self.running():
+			self.start()
+
+		ReadyMarks	= []
+		Commands	= ''
+		for Args in ArgsList:
+			self.__count	+= 1
+			ReadyMarks.append(f'{{ready{self.__count}}}'.encode())
+			Commands	+= '\n'.join(Args + [f'-execute{self.__count}']) + '\n'
+
+		BytesReadBefore	= self.__get_bytes_read()
+
+		self.__proc.stdin.write(Commands.encode('utf-8', errors='surrogateescape'))
+		self.__proc.stdin.flush()
+
+		Outputs		= []
+		Output		= b''
+		Deadline	= time.time() + self.Timeout
+		StdOut		= self.__proc.stdout.fileno()
+
+		while len(Outputs) < len(ReadyMarks):
+			ReadyMark	= ReadyMarks[len(Outputs)]
+
+			if ReadyMark in Output:
+				Done, Output	= Output.split(ReadyMark, 1)
+				Outputs.append(Done.strip(b'\n').decode('utf-8', errors='replace'))
+
+				Deadline	= time.time() + self.Timeout
+				continue
+
+			Remaining	= Deadline - time.time()
+			if Remaining <= 0:
+				raise TimeoutError('exiftool did not answer in time')
+
+			Readable, _, _	= select.select([StdOut], [], [], Remaining)
+			if not Readable:
+				continue
+
+			Chunk	= os.read(StdOut, 65536)
+			if not Chunk:
+				raise EOFError('exiftool terminated unexpectedly')
+
+			Output	+= Chunk
+
+		self.BytesRead	+= max(0, self.__get_bytes_read() - BytesReadBefore)
+
+		return(Outputs)
+
+	def __get_bytes_read(self):
+		# bytes read by the process, 0 if unknown
+		try:
+			with open(f'/proc/{self.__proc.pid}/io') as f:
+				for Line in f:
+					if Line.startswith('rchar:'):
+						return(int(Line.split()[1]))
+		except (OSError, ValueError):
+			pass
+
+		return(0)
+
+class pool(object):
+
+	def __init__(self, Workers=2, Timeout=30):
+		self.Workers	= max(1, Workers)
+		self.Timeout	= Timeout
+
+		self.available	= True
+
+		self.__idle		= queue.Queue()
+		self.__all		= []
+		self.__lock		= threading.Lock()
+
+		# bytes read by workers closed
+		self.__bytes_read	= 0
+
+	def __get_worker(self):
+		try:
+			return(self.__idle.get_nowait())
+		except queue.Empty:
+			pass
+
+		with self.__lock:
+			if len(self.__all) < self.Workers:
+				Worker	= worker(self.Timeout)
+				self.__all.append(Worker)
+				return(Worker)
+
+		return(self.__idle.get())
+
+	def execute(self, Args):
+		# returns the output of exiftool or None if exiftool could not handle the request
+		Outputs	= self.execute_many([Args])
+		return(None if Outputs is None else Outputs[0])
+
+	def execute_many(self, ArgsList):
+		# several commands by one worker, returns the list of outputs or None
+
+		if not self.available:
+			return(None)
+
+		Worker	= self.__get_worker()
+
+		try:
+			return(Worker.execute_many(ArgsList))
+
+		except FileNotFoundError:
+			print('exiftool not found, please install it.', file=sys.stderr)
+			self.available	= False
+			return(None)
+
+		except Exception as e:
+			# hanging or dead worker: restart it with the next request
+			print(f'exiftool worker restarted: {e}', file=sys.stderr)
+			Worker.kill()
+			return(None)
+
+		finally:
+			self.__idle.put(Worker)
+
+	def bytes_read(self):
+		# bytes read by exiftool for all commands so far
+		with self.__lock:
+			return(self.__bytes_read + sum(Worker.BytesRead for Worker in self.__all))
+
+	def close(self):
+		with self.__lock:
+			for Worker in self.__all:
+				Worker.stop()
+				self.__bytes_read	+= Worker.BytesRead
+
+			self.__all	= []
+
+		self.__idle	= queue.Queue()
+
+if __name__ == "__main__":
+	pass
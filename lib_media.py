@@ -21,13 +21,125 @@ from datetime import datetime
 import os
 import re
 import subprocess
-# import sys#xxx
+import sys
+
+import lib_metadata
+
+# date tags in order of priority
+DateTags	= [
+	'CreateDate',
+	'CreationDate',
+	'MediaCreateDate',
+	'DateTimeOriginal',
+	'FileModifyDate',
+	'FileAccessDate'
+]
+
+# date tags only reflecting the file system
+FilesystemDateTags	= [
+	'FileModifyDate',
+	'FileAccessDate'
+]
+
+# dates in file names: name: pattern with named groups year, month, day and optional hour, minute, second
+FilenameDatePatterns	= {
+	# own pattern of the archivist: YYYY-MM-DD_HH-MM-SS_-_...
+	'archivist':	r"^(?P<year>\d{4})-(?P<month>[01]\d)-(?P<day>[0-3]\d)_(?P<hour>[0-2]\d)-(?P<minute>[0-5]\d)-(?P<second>[0-5]\d)_-",
+	# IMG_20240101_123456.jpg, VID_20240101_123456.mp4, MVIMG_..., PANO_..., BURST001_...
+	'camera':		r"^(?:IMG|VID|MVIMG|PANO|BURST\d*)_(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})_(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})(?!\d)",
+	# 20240101_123456.jpg
+	'samsung':		r"^(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})_(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})(?!\d)",
+	# Screenshot_2024-01-01-12-00-00.png, Screenshot_20240101-120000.png
+	'screenshot':	r"^Screenshot_(?P<year>\d{4})-?(?P<month>\d{2})-?(?P<day>\d{2})[-_](?P<hour>\d{2})-?(?P<minute>\d{2})-?(?P<second>\d{2})",
+	# signal-2024-01-01-120000.jpg
+	'signal':		r"^signal-(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})-(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})",
+	# PXL_20240101_123456789.mp4, Pixel phones name their files in UTC
+	'pixel':		r"^PXL_(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})_(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})\d{3}",
+	# IMG-20240101-WA0001.jpg, VID-20240101-WA0001.mp4: date only
+	'whatsapp':		r"^(?:IMG|VID|AUD|PTT|STK)-(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})-WA\d+",
+}
+
+# number of files whose create date is written by one request to exiftool
+WRITE_BATCH_SIZE	= 100
+
+# how the date of a file was found
+DATE_FILENAME		= 'filename'
+DATE_NATIVE			= 'native'
+DATE_EXIFTOOL		= 'exiftool'
+DATE_FILENAME_LOW	= 'filename low trust'
+DATE_FILESYSTEM		= 'filesystem'
+DATE_NONE			= 'none'
+DATE_CACHE			= 'cache'
+
+# exiftool options of the read strategies
+READ_OPTIONS	= {
+	# no scan for trailers at the end of the file
+	'fast':		['-fast'],
+	# also no maker notes
+	'fast2':	['-fast2']
+}
+
+TRUST_HIGH	= 'high'
+TRUST_LOW	= 'low'
+
+def get_filename_patterns(HighTrust='archivist', LowTrust=''):
+	# compile the named patterns once: returns [(name, compiled pattern, trust), ...]
+	Patterns	= []
+
+	for Names, Trust in [(HighTrust, TRUST_HIGH), (LowTrust, TRUST_LOW)]:
+		for Name in Names.split(';'):
+			Name	= Name.strip()
+			if not Name:
+				continue
+
+			if Name in FilenameDatePatterns:
+				Patterns.append((Name, re.compile(FilenameDatePatterns[Name], re.IGNORECASE), Trust))
+			else:
+				print(f"Unknown file name date pattern '{Name}', known are: {';'.join(FilenameDatePatterns.keys())}", file=sys.stderr)
 
-class mediafile(object):
+	return(Patterns)
+
+DefaultFilenamePatterns	= get_filename_patterns()
+
+class readstrategy(object):
+	# how the metadata of a category of files is read: 'fast;max_mb=64'
+
+	def __init__(self, Strategy=''):
+		self.ExiftoolArgs	= []
+
+		# maximum bytes read from a file, None: no limit
+		self.MaxBytes		= None
+
+		for Option in Strategy.split(';'):
+			Option	= Option.strip().lower()
+			if not Option:
+				continue
+
+			if Option in READ_OPTIONS:
+				self.ExiftoolArgs	+= READ_OPTIONS[Option]
+			elif Option.startswith('max_mb='):
+				try:
+					self.MaxBytes	= int(Option[7:]) * 1048576
+				except ValueError:
+					print(f"Read strategy option '{Option}' ignored, expected max_mb=<number>", file=sys.stderr)
+			else:
+				print(f"Unknown read strategy option '{Option}', known are: {';'.join(READ_OPTIONS.keys())};max_mb=<number>", file=sys.stderr)
+
+	def allows_exiftool(self, FilePathName):
+		# exiftool can not be limited: not used for larger files
+		if self.MaxBytes is None:
+			return(True)
+
+		try:
+			return(os.path.getsize(FilePathName) <= self.MaxBytes)
+		except OSError:
+			return(False)
 
-	def __init__(self, FilePathName, rename = False):
-		self.__pattern		= re.compile(r"^\d{4}-[01]\d-[0-3]\d_[0-2]\d-[0-5]\d-[0-5]\d_-")
+DefaultReadStrategy	= readstrategy()
 
+class mediafile(object):
+
+	def __init__(self, FilePathName, rename = False, exiftool = None, native = True, filename_patterns = None, CaptureTime = None, strategy = None):
 		self.FilePathName	= FilePathName
 		self.FileName		= os.path.basename(FilePathName)
 		self.FilePath		= os.path.dirname(FilePathName)
@@ -38,53 +150,78 @@ class mediafile(object):
 			self.FileName_plain	= self.FileName
 
 		self.rename			= rename
-		self.pattern_match	= bool(self.__pattern.match(self.FileName))
+		self.exiftool		= exiftool
+		self.native			= native
+
+		self.filename_patterns	= DefaultFilenamePatterns if filename_patterns is None else filename_patterns
+		self.strategy			= DefaultReadStrategy if strategy is None else strategy
+
+		# bytes read from the file by the header reader, exiftool is counted by its processes
+		self.BytesRead			= 0
 
 		self.exifdate_exists	= True
 
-		self.__read_datetime()
+		# read on demand
+		self.camera_model		= None
+		self.__native_tags		= None
+
+		if CaptureTime:
+			# known from an earlier run
+			self.DateMethod	= DATE_CACHE
+			self.__get_datetime_from_string(CaptureTime)
+		else:
+			self.__read_datetime()
 
 	def __read_datetime(self):
 
-		if self.pattern_match:
-			# use filename as date source
-			if self.__get_datetime_from_string(self.FileName):
-				return(True)
-			else:
-				return(self.set_panic_values())
+		# use filename as date source if trusted
+		FilenameDate	= self.__get_datetime_from_filename(TRUST_HIGH)
+		if FilenameDate:
+			self.DateMethod	= DATE_FILENAME
+			return(self.__get_datetime_from_string(FilenameDate))
 
-		else:
-			# read exif data from file
-			DateTags		=  [
-				'CreateDate',
-				'CreationDate',
-				'MediaCreateDate',
-				'DateTimeOriginal',
-				'FileModifyDate',
-				'FileAccessDate'
-			]
+		# read supported file formats without exiftool
+		if self.native:
+			NativeTags	= self.__read_native_tags()
+			self.__native_tags	= NativeTags
 
+			if NativeTags:
+				for DateTag in DateTags:
+					if DateTag in NativeTags:
+						self.DateMethod	= DATE_NATIVE
+						return(self.__get_datetime_from_string(NativeTags[DateTag]))
+
+		# read exif data from file, all date tags in one request
+		ExifArgs	= self.strategy.ExiftoolArgs + ['-dateFormat', '%Y-%m-%d_%H-%M-%S', '-S'] + [f"-{DateTag}" for DateTag in DateTags] + [self.FilePathName]
+
+		if not self.strategy.allows_exiftool(self.FilePathName):
+			# too large for the read strategy: file name or file system
 			EXIF_output	= ''
-			for DateTag in DateTags:
-				ExifCommand		= ['exiftool', os.path.join(self.FilePath, self.FileName), '-dateFormat', '%Y-%m-%d_%H-%M-%S'] + [f"-{DateTag}"] + ['-S']
-				try:
-					EXIF_output	= subprocess.check_output(ExifCommand, text=True).strip()
-				except:
-					pass
+		elif (self.exiftool is None) or ('\n' in self.FilePathName):
+			# no worker available or path can not be passed by argfile
+			try:
+				EXIF_output	= subprocess.check_output(['exiftool'] + ExifArgs, text=True)
+			except:
+				EXIF_output	= ''
+		else:
+			EXIF_output	= self.exiftool.execute(ExifArgs)
 
-				if EXIF_output:
-					# first hit finishes search
-					break
+		ExifValues	= self.__parse_exif_output(EXIF_output)
 
-			if not EXIF_output:
-				return(self.set_panic_values())
-			else:
+		# first hit in order of DateTags finishes search
+		for DateTag in DateTags:
+			if DateTag in FilesystemDateTags:
+				# less trusted file names come before the file system
+				FilenameDate	= self.__get_datetime_from_filename(TRUST_LOW)
+				if FilenameDate:
+					self.exifdate_exists	= False
+					self.DateMethod	= DATE_FILENAME_LOW
+					return(self.__get_datetime_from_string(FilenameDate))
 
-				try:
-					Val	= EXIF_output.split(':', 1)[1].strip()
-				except:
-					Val	= None
-				if not Val is None:
+			if DateTag in ExifValues:
+				Val	= ExifValues[DateTag]
+				if Val:
+					self.DateMethod	= DATE_FILESYSTEM if DateTag in FilesystemDateTags else DATE_EXIFTOOL
 					return(self.__get_datetime_from_string(Val))
 				else:
 					self.exifdate_exists	= False
@@ -92,11 +229,55 @@ class mediafile(object):
 
 		return(self.set_panic_values())
 
+	def __get_datetime_from_filename(self, Trust):
+		for Name, Pattern, PatternTrust in self.filename_patterns:
+			if PatternTrust != Trust:
+				continue
+
+			Match	= Pattern.match(self.FileName)
+			if not Match:
+				continue
+
+			Values	= Match.groupdict()
+			DateTime	= [Values.get(Part) or '00' for Part in ['year', 'month', 'day', 'hour', 'minute', 'second']]
+
+			# skip impossible dates
+			try:
+				datetime(*[int(Part) for Part in DateTime])
+			except ValueError:
+				continue
+
+			return('-'.join(DateTime))
+
+		return(None)
+
+	def __parse_exif_output(self, EXIF_output):
+		ExifValues	= {}
+
+		if not EXIF_output:
+			return(ExifValues)
+
+		for Line in EXIF_output.splitlines():
+			try:
+				Tag, Val	= Line.split(':', 1)
+			except:
+				continue
+
+			Tag	= Tag.strip()
+
+			# exiftool may report a tag from several groups, the first one wins
+			if Tag and not Tag in ExifValues:
+				ExifValues[Tag]	= Val.strip()
+
+		return(ExifValues)
+
 	def set_panic_values(self):
 		if not self.get_filesystem_values():
+			self.DateMethod	= DATE_NONE
 			self.set_null_values()
 			return(False)
 		else:
+			self.DateMethod	= DATE_FILESYSTEM
 			return(True)
 
 	def get_filesystem_values(self):
@@ -129,6 +310,31 @@ class mediafile(object):
 			self.set_null_values()
 			return(False)
 
+	def get_camera_model(self):
+		if self.camera_model is None:
+			self.camera_model	= ''
+
+			Tags	= self.__native_tags
+			if Tags is None and self.native:
+				Tags	= self.__read_native_tags()
+
+			if Tags and Tags.get('Model'):
+				self.camera_model	= Tags['Model']
+			elif not self.exiftool is None and self.strategy.allows_exiftool(self.FilePathName):
+				self.camera_model	= self.__parse_exif_output(self.exiftool.execute(self.strategy.ExiftoolArgs + ['-S', '-Model', self.FilePathName])).get('Model', '')
+
+		return(self.camera_model)
+
+	def __read_native_tags(self):
+		# returns the tags found or None if the file format is not supported
+		Reader	= lib_metadata.reader(self.FilePathName, self.strategy.MaxBytes)
+		self.BytesRead	+= Reader.BytesRead
+
+		return(Reader.tags if Reader.supported else None)
+
+	def get_capture_time(self):
+		return(f'{self.year}-{self.month}-{self.day}_{self.hour}-{self.minute}-{self.second}')
+
 	def get_new_FilePath(self):
 		PathLevel_year	= f'{self.year}'
 		PathLevel_month	= f'{self.year}-{self.month}'
@@ -144,4 +350,40 @@ class mediafile(object):
 		else:
 			return(self.FileName_plain)
 
+class createdatewriter(object):
+	# writes the create date into files without one, collected and written in groups
+
+	def __init__(self, exiftool, BatchSize=WRITE_BATCH_SIZE):
+		self.exiftool	= exiftool
+		self.BatchSize	= max(1, BatchSize)
+
+		self.__pending	= []
+
+		# [(FilePathName, CreateDate), ...]
+		self.Written	= []
+		self.Failed		= []
 
+	def add(self, FilePathName, fileobj):
+		CreateDate	= f"{fileobj.year}:{fileobj.month}:{fileobj.day} {fileobj.hour}:{fileobj.minute}:{fileobj.second}"
+		self.__pending.append((FilePathName, CreateDate))
+
+		if len(self.__pending) >= self.BatchSize:
+			self.flush()
+
+	def flush(self):
+		if not self.__pending:
+			return
+
+		Pending	= self.__pending
+		self.__pending	= []
+
+		print(f"Writing 'Create Date' into {len(Pending)} media files ...")
+
+		# one value per file: one command per file, all sent at once
+		Outputs	= self.exiftool.execute_many([['-overwrite_original', f'-CreateDate={CreateDate}', FilePathName] for FilePathName, CreateDate in Pending])
+
+		for i, (FilePathName, CreateDate) in enumerate(Pending):
+			if Outputs is None or not '1 image files updated' in Outputs[i]:
+				self.Failed.append((FilePathName, CreateDate))
+			else:
+				self.Written.append((FilePathName, CreateDate))
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Reads capture dates from JPEG, TIFF based RAW, HEIC and MP4/MOV headers without external tools.
+# Tags are named like in exiftool, values are formatted like exiftool's default 'YYYY:MM:DD HH:MM:SS'.
+
+from datetime import datetime, timedelta
+import struct
+import subprocess
+import sys
+
+# TIFF tags
+TIFF_TAG_MODEL				= 0x0110
+TIFF_TAG_EXIF_IFD			= 0x8769
+TIFF_TAG_DATETIMEORIGINAL	= 0x9003
+TIFF_TAG_CREATEDATE			= 0x9004
+
+# limits against broken files
+MAX_IFD_ENTRIES		= 1024
+MAX_JPEG_SEGMENTS	= 64
+MAX_ILOC_SIZE		= 1024 * 1024
+
+QUICKTIME_EPOCH	= datetime(1904, 1, 1)
+
+# Canon CR3 keeps its EXIF in proprietary boxes, mvhd does not match exiftool's CreateDate there
+UNSUPPORTED_BMFF_BRANDS	= [b'crx ']
+
+class reader(object):
+
+	def __init__(self, FilePathName, MaxBytes=None):
+		# MaxBytes: reading stops after this many bytes, None: no limit
+		self.FilePathName	= FilePathName
+		self.MaxBytes		= MaxBytes
+
+		self.tags		= {}
+		self.supported	= False
+
+		self.BytesRead	= 0
+
+		try:
+			with open(self.FilePathName, 'rb') as self.__f:
+				self.__read()
+		except Exception:
+			pass
+
+	def __read_at(self, Offset, Length):
+		if not self.MaxBytes is None:
+			Length	= max(0, min(Length, self.MaxBytes - self.BytesRead))
+
+		self.__f.seek(Offset)
+		Data	= self.__f.read(Length)
+
+		self.BytesRead	+= len(Data)
+
+		return(Data)
+
+	def __read(self):
+		Head	= self.__read_at(0, 16)
+
+		if Head[0:2] == b'\xff\xd8':
+			self.supported	= True
+			self.__read_jpeg()
+
+		elif Head[0:4] in (b'II*\x00', b'MM\x00*', b'IIRO', b'IIU\x00'):
+			# TIFF, most RAW formats, ORF and RW2
+			self.supported	= True
+			self.__read_tiff(0)
+
+		elif Head[4:8] == b'ftyp':
+			if Head[8:12] in UNSUPPORTED_BMFF_BRANDS:
+				return
+
+			self.supported	= True
+			self.__read_bmff()
+
+	# JPEG
+
+	def __read_jpeg(self):
+		Offset	= 2
+
+		for i in range(MAX_JPEG_SEGMENTS):
+			Marker	= self.__read_at(Offset, 4)
+			if len(Marker) < 4 or Marker[0] != 0xff:
+				return
+
+			MarkerType	= Marker[1]
+			if MarkerType in (0xd9, 0xda):
+				# end of image or start of scan: no more metadata
+				return
+
+			SegmentLength	= struct.unpack('>H', Marker[2:4])[0]
+
+			if MarkerType == 0xe1:
+				if self.__read_at(Offset + 4, 6) == b'Exif\x00\x00':
+					self.__read_tiff(Offset + 10)
+					return
+
+			Offset	+= 2 + SegmentLength
+
+	# TIFF / EXIF
+
+	def __read_tiff(self, Base):
+		Header	= self.__read_at(Base, 8)
+		if len(Header) < 8:
+			return
+
+		Endian	= '<' if Header[0:2] == b'II' else '>'
+		IFD0	= struct.unpack(f'{Endian}I', Header[4:8])[0]
+
+		Entries	= self.__read_ifd(Base, Endian, IFD0)
+
+		if TIFF_TAG_MODEL in Entries:
+			self.__set_tag('Model', self.__read_ascii(Base, Endian, Entries[TIFF_TAG_MODEL]))
+
+		if TIFF_TAG_EXIF_IFD in Entries:
+			ExifIFD	= struct.unpack(f'{Endian}I', Entries[TIFF_TAG_EXIF_IFD][2])[0]
+			ExifEntries	= self.__read_ifd(Base, Endian, ExifIFD)
+
+			if TIFF_TAG_CREATEDATE in ExifEntries:
+				self.__set_date('CreateDate', self.__read_ascii(Base, Endian, ExifEntries[TIFF_TAG_CREATEDATE]))
+
+			if TIFF_TAG_DATETIMEORIGINAL in ExifEntries:
+				self.__set_date('DateTimeOriginal', self.__read_ascii(Base, Endian, ExifEntries[TIFF_TAG_DATETIMEORIGINAL]))
+
+	def __read_ifd(self, Base, Endian, Offset):
+		# returns {tag: (type, count, raw value or offset)}
+		Entries	= {}
+
+		if not Offset:
+			return(Entries)
+
+		Count	= struct.unpack(f'{Endian}H', self.__read_at(Base + Offset, 2))[0]
+		Count	= min(Count, MAX_IFD_ENTRIES)
+
+		Data	= self.__read_at(Base + Offset + 2, Count * 12)
+		for i in range(len(Data) // 12):
+			Tag, Type, ValCount	= struct.unpack(f'{Endian}HHI', Data[i * 12:i * 12 + 8])
+			Entries[Tag]	= (Type, ValCount, Data[i * 12 + 8:i * 12 + 12])
+
+		return(Entries)
+
+	def __read_ascii(self, Base, Endian, Entry):
+		Type, Count, Value	= Entry
+
+		if Type != 2 or Count > 256:
+			return('')
+
+		if Count <= 4:
+			Raw	= Value[:Count]
+		else:
+			Raw	= self.__read_at(Base + struct.unpack(f'{Endian}I', Value)[0], Count)
+
+		if len(Raw) < Count:
+			# truncated file or MaxBytes reached: part of a date would be a wrong date
+			return('')
+
+		return(Raw.split(b'\x00', 1)[0].decode('ascii', errors='ignore').strip())
+
+	# ISO base media file format: MP4, MOV, HEIC
+
+	def __boxes(self, Start, End):
+		# yields (type, payload offset, payload end)
+		Offset	= Start
+
+		while End is None or Offset + 8 <= End:
+			Header	= self.__read_at(Offset, 16)
+			if len(Header) < 8:
+				return
+
+			Size, BoxType	= struct.unpack('>I4s', Header[0:8])
+			HeaderSize	= 8
+
+			if Size == 1:
+				if len(Header) < 16:
+					return
+				Size	= struct.unpack('>Q', Header[8:16])[0]
+				HeaderSize	= 16
+			elif Size == 0:
+				# box extends to the end of the file
+				self.__f.seek(0, 2)
+				Size	= self.__f.tell() - Offset
+
+			if Size < HeaderSize:
+				return
+
+			yield(BoxType, Offset + HeaderSize, Offset + Size)
+
+			Offset	+= Size
+
+	def __find_box(self, Start, End, BoxType):
+		for Type, PayloadStart, PayloadEnd in self.__boxes(Start, End):
+			if Type == BoxType:
+				return(PayloadStart, PayloadEnd)
+
+		return(None, None)
+
+	def __read_bmff(self):
+		MoovStart, MoovEnd	= None, None
+		MetaStart, MetaEnd	= None, None
+
+		for BoxType, PayloadStart, PayloadEnd in self.__boxes(0, None):
+			if BoxType == b'moov':
+				MoovStart, MoovEnd	= PayloadStart, PayloadEnd
+			elif BoxType == b'meta':
+				MetaStart, MetaEnd	= PayloadStart, PayloadEnd
+
+		if not MoovStart is None:
+			self.__read_mvhd(MoovStart, MoovEnd)
+
+		if not MetaStart is None:
+			self.__read_heif_exif(MetaStart, MetaEnd)
+
+	def __read_mvhd(self, Start, End):
+		MvhdStart, MvhdEnd	= self.__find_box(Start, End, b'mvhd')
+		if MvhdStart is None:
+			return
+
+		Data	= self.__read_at(MvhdStart, 12)
+		if len(Data) < 12:
+			return
+
+		if Data[0] == 1:
+			CreationTime	= struct.unpack('>Q', Data[4:12])[0]
+		else:
+			CreationTime	= struct.unpack('>I', Data[4:8])[0]
+
+		if CreationTime:
+			# exiftool shows QuickTime dates unconverted (as stored, UTC by specification)
+			try:
+				self.__set_date('CreateDate', (QUICKTIME_EPOCH + timedelta(seconds=CreationTime)).strftime('%Y:%m:%d %H:%M:%S'))
+			except OverflowError:
+				pass
+
+	def __read_heif_exif(self, Start, End):
+		# meta is a full box: skip version and flags
+		Start	+= 4
+
+		IinfStart, IinfEnd	= self.__find_box(Start, End, b'iinf')
+		IlocStart, IlocEnd	= self.__find_box(Start, End, b'iloc')
+		if IinfStart is None or IlocStart is None:
+			return
+
+		ExifItemID	= self.__get_heif_exif_item(IinfStart, IinfEnd)
+		if ExifItemID is None:
+			return
+
+		Extent	= self.__get_heif_item_extent(IlocStart, IlocEnd, ExifItemID)
+		if Extent is None:
+			return
+
+		# exif item: 4 bytes offset to the TIFF header, followed by 'Exif\0\0' usually
+		ItemOffset, ItemLength	= Extent
+		TiffHeaderOffset	= struct.unpack('>I', self.__read_at(ItemOffset, 4))[0]
+		self.__read_tiff(ItemOffset + 4 + TiffHeaderOffset)
+
+	def __get_heif_exif_item(self, Start, End):
+		Data	= self.__read_at(Start, 8)
+		Version	= Data[0]
+		Offset	= Start + (8 if Version > 0 else 6)
+
+		for BoxType, PayloadStart, PayloadEnd in self.__boxes(Offset, End):
+			if BoxType != b'infe':
+				continue
+
+			Infe	= self.__read_at(PayloadStart, min(PayloadEnd - PayloadStart, 16))
+			InfeVersion	= Infe[0]
+			if InfeVersion < 2:
+				continue
+
+			if InfeVersion == 2:
+				ItemID		= struct.unpack('>H', Infe[4:6])[0]
+				ItemType	= Infe[8:12]
+			else:
+				ItemID		= struct.unpack('>I', Infe[4:8])[0]
+				ItemType	= Infe[10:14]
+
+			if ItemType == b'Exif':
+				return(ItemID)
+
+		return(None)
+
+	def __get_heif_item_extent(self, Start, End, ItemID):
+		Data	= self.__read_at(Start, min(End - Start, MAX_ILOC_SIZE))
+		Version	= Data[0]
+
+		OffsetSize		= Data[4] >> 4
+		LengthSize		= Data[4] & 0x0f
+		BaseOffsetSize	= Data[5] >> 4
+		IndexSize		= (Data[5] & 0x0f) if Version in (1, 2) else 0
+
+		Pos	= 6
+		if Version < 2:
+			ItemCount	= struct.unpack('>H', Data[Pos:Pos + 2])[0]
+			Pos	+= 2
+		else:
+			ItemCount	= struct.unpack('>I', Data[Pos:Pos + 4])[0]
+			Pos	+= 4
+
+		def read_uint(Size):
+			nonlocal Pos
+			Value	= int.from_bytes(Data[Pos:Pos + Size], 'big') if Size else 0
+			Pos	+= Size
+			return(Value)
+
+		for i in range(ItemCount):
+			CurrentItemID	= read_uint(2 if Version < 2 else 4)
+
+			ConstructionMethod	= 0
+			if Version in (1, 2):
+				ConstructionMethod	= read_uint(2) & 0x0f
+
+			read_uint(2) # data reference index
+			BaseOffset	= read_uint(BaseOffsetSize)
+			ExtentCount	= read_uint(2)
+
+			Extents	= []
+			for j in range(ExtentCount):
+				read_uint(IndexSize)
+				Extents.append((BaseOffset + read_uint(OffsetSize), read_uint(LengthSize)))
+
+			if CurrentItemID == ItemID:
+				if ConstructionMethod != 0 or not Extents:
+					# data in idat or item references: not supported
+					return(None)
+
+				return(Extents[0])
+
+		return(None)
+
+	# values
+
+	def __set_tag(self, Tag, Value):
+		if Value and not Tag in self.tags:
+			self.tags[Tag]	= Value
+
+	def __set_date(self, Tag, Value):
+		# empty dates are written as '0000:00:00 00:00:00' or blanks by some cameras
+		if Value and Value.strip(' :0'):
+			self.__set_tag(Tag, Value)
+
+def read_tags(FilePathName, MaxBytes=None):
+	# returns the tags found or None if the file format is not supported
+	Reader	= reader(FilePathName, MaxBytes)
+
+	if Reader.supported:
+		return(Reader.tags)
+	else:
+		return(None)
+
+if __name__ == "__main__":
+	# compare the results with exiftool: python3 lib_metadata.py FILE [FILE ...]
+	for FilePathName in sys.argv[1:]:
+		print(FilePathName)
+		print(f" native:   {read_tags(FilePathName)}")
+
+		try:
+			print(' exiftool: ' + subprocess.check_output(['exiftool', '-S', '-CreateDate', '-DateTimeOriginal', '-Model', FilePathName], text=True).replace('\n', '; '))
+		except Exception as e:
+			print(f" exiftool: {e}")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Sets ownership and permissions of single files and folders at the target
+
+import grp
+import os
+import pwd
+import subprocess
+import sys
+import threading
+
+# number of paths per chmod call for symbolic modes
+CHMOD_BATCH_SIZE	= 200
+
+class permissions(object):
+
+	def __init__(self, User='', Group='', Mode=''):
+		self.User	= User
+		self.Group	= Group
+		self.Mode	= Mode
+
+		self.uid	= None
+		self.gid	= None
+
+		# ownership only if user and group are defined
+		if self.User and self.Group:
+			try:
+				self.uid	= int(self.User) if self.User.isdigit() else pwd.getpwnam(self.User).pw_uid
+				self.gid	= int(self.Group) if self.Group.isdigit() else grp.getgrnam(self.Group).gr_gid
+			except KeyError as e:
+				print(f"Unknown user or group {self.User}:{self.Group}: {e}", file=sys.stderr)
+				self.uid, self.gid	= None, None
+
+		# octal modes are set directly, symbolic modes like 'u+rwX' by chmod
+		self.mode			= None
+		self.mode_symbolic	= ''
+		if self.Mode:
+			try:
+				self.mode	= int(self.Mode, 8)
+			except ValueError:
+				self.mode_symbolic	= self.Mode
+
+		self.__pending	= []
+		self.__lock		= threading.Lock()
+
+		self.Errors		= 0
+
+	def configured(self):
+		return(not self.uid is None or not self.mode is None or bool(self.mode_symbolic))
+
+	def apply(self, Path):
+		if not self.uid is None:
+			try:
+				os.chown(Path, self.uid, self.gid, follow_symlinks=False)
+			except OSError as e:
+				self.__error(Path, e)
+
+		if not self.mode is None:
+			try:
+				os.chmod(Path, self.mode)
+			except OSError as e:
+				self.__error(Path, e)
+
+		elif self.mode_symbolic:
+			with self.__lock:
+				self.__pending.append(Path)
+				if len(self.__pending) < CHMOD_BATCH_SIZE:
+					return
+
+				Pending	= self.__pending
+				self.__pending	= []
+
+			self.__chmod(Pending)
+
+	def flush(self):
+		with self.__lock:
+			Pending	= self.__pending
+			self.__pending	= []
+
+		if Pending:
+			self.__chmod(Pending)
+
+	def apply_tree(self, Root):
+		# repairs a whole tree
+		self.apply(Root)
+
+		for DirPath, DirNames, FileNames in os.walk(Root):
+			for Name in DirNames + FileNames:
+				self.apply(os.path.join(DirPath, Name))
+
+		self.flush()
+
+	def __chmod(self, Paths):
+		try:
+			subprocess.run(['chmod', self.mode_symbolic, '--'] + Paths)
+		except OSError as e:
+			self.__error(Paths[0], e)
+
+	def __error(self, Path, e):
+		self.Errors	+= 1
+
+		# one message is enough
+		if self.Errors == 1:
+			print(f"Can not set ownership or permissions of '{Path}': {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+	pass
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Stages with their own worker threads, connected by bounded queues
+
+import queue
+import sys
+import threading
+
+class item(object):
+	# one unit of work passed through the stages
+
+	def __init__(self, Seq, SourceFile):
+		self.Seq		= Seq
+		self.SourceFile	= SourceFile
+
+		# dropped by a stage: only passed on to keep the order of ordered stages
+		self.Skip		= False
+
+class stage(object):
+
+	def __init__(self, Name, Function, Workers=1, QueueSize=100, Ordered=False, OnIdle=None, OnDrop=None, SortKey=None, Window=0):
+		# Function(item) returns the item for the next stage or None
+		# Ordered: items are processed in the order of item.Seq, every Seq has to arrive exactly once
+		# OnIdle: called about once a second while there is nothing to do
+		# OnDrop(item): called for items not processed because of abort() or an error
+		# SortKey(result): results are passed on sorted by this key in groups of up to Window results,
+		#	earlier if the next stage has nothing to do; equal keys keep their order,
+		#	results with the key None are passed on after all results before
+
+		self.Name		= Name
+		self.Function	= Function
+		self.Workers	= max(1, Workers)
+		self.Ordered	= Ordered
+		self.OnIdle		= OnIdle
+		self.OnDrop		= OnDrop
+		self.SortKey	= SortKey
+		self.Window		= max(1, Window)
+
+		self.Next		= None
+
+		self.MaxDepth	= 0
+		self.Busy		= 0
+		self.Processed	= 0
+
+		self.__queue	= queue.Queue(maxsize=max(1, QueueSize))
+		self.__aborted	= False
+		self.__lock		= threading.Lock()
+
+		# reorder buffer of ordered stages
+		self.__waiting	= {}
+		self.__next_seq	= 0
+
+		# sort window: [(SortKey, Count, Result), ...]
+		self.__window	= []
+		self.__count	= 0
+
+		self.__threads	= []
+
+	def start(self):
+		for i in range(self.Workers):
+			Thread	= threading.Thread(target=self.__run, name=f'{self.Name}-{i}', daemon=True)
+			Thread.start()
+			self.__threads.append(Thread)
+
+	def depth(self):
+		return(self.__queue.qsize() + len(self.__waiting) + len(self.__window))
+
+	def running_low(self):
+		# fewer items waiting than workers
+		return(self.__queue.qsize() < self.Workers)
+
+	def put(self, Item):
+		self.__queue.put(Item)
+
+		Depth	= self.depth()
+		if Depth > self.MaxDepth:
+			self.MaxDepth	= Depth
+
+	def abort(self):
+		# items still waiting are dropped, items in progress are finished
+		self.__aborted	= True
+
+	def close(self):
+		# waits until all items are processed, then closes the next stage
+		for Thread in self.__threads:
+			self.__queue.put(None)
+
+		for Thread in self.__threads:
+			Thread.join()
+
+		if not self.Next is None:
+			self.Next.close()
+
+	def __run(self):
+		while True:
+			try:
+				Item	= self.__queue.get(timeout=1)
+			except queue.Empty:
+				self.__flush(All=True)
+
+				if not self.OnIdle is None:
+					self.OnIdle()
+				continue
+
+			if Item is None:
+				self.__flush(All=True)
+				break
+
+			if self.Ordered:
+				# single worker expected: process all items which are due now
+				self.__waiting[Item.Seq]	= Item
+
+				while self.__next_seq in self.__waiting:
+					Item	= self.__waiting.pop(self.__next_seq)
+					self.__next_seq	+= 1
+
+					if not Item.Skip:
+						self.__process(Item)
+			else:
+				self.__process(Item)
+
+	def __process(self, Item):
+		if self.__aborted:
+			self.__drop(Item)
+			return
+
+		with self.__lock:
+			self.Busy	+= 1
+
+		try:
+			Result	= self.Function(Item)
+		except Exception as e:
+			print(f"Error in stage {self.Name}: {e}", file=sys.stderr)
+			Result	= None
+
+			self.__drop(Item)
+
+		with self.__lock:
+			self.Busy		-= 1
+			self.Processed	+= 1
+
+		if self.Next is None:
+			return
+
+		if not Result is None:
+			if self.SortKey is None:
+				self.Next.put(Result)
+			else:
+				self.__sort(Result)
+		elif self.Next.Ordered and not Item.Skip:
+			# keep the sequence of the next stage complete
+			Item.Skip	= True
+			self.Next.put(Item)
+
+	def __sort(self, Result):
+		SortKey	= self.SortKey(Result)
+
+		if SortKey is None:
+			self.__flush(All=True)
+			self.Next.put(Result)
+			return
+
+		with self.__lock:
+			self.__window.append((SortKey, self.__count, Result))
+			self.__count	+= 1
+
+		self.__flush(All=False)
+
+	def __flush(self, All):
+		# passes on the sorted window if it is full or the next stage runs out of work
+		with self.__lock:
+			if not self.__window:
+				return
+
+			if not All and len(self.__window) < self.Window and not self.Next.running_low():
+				return
+
+			Window	= sorted(self.__window, key=lambda Entry: Entry[:2])
+			self.__window	= []
+
+		for SortKey, Count, Result in Window:
+			self.Next.put(Result)
+
+	def __drop(self, Item):
+		if not self.OnDrop is None:
+			self.OnDrop(Item)
+
+		if not (self.Next is None) and self.Next.Ordered:
+			Item.Skip	= True
+			self.Next.put(Item)
+
+class pipeline(object):
+
+	def __init__(self, Stages, StatusIntervalSec=0):
+		self.Stages				= Stages
+		self.StatusIntervalSec	= StatusIntervalSec
+
+		for i in range(len(self.Stages) - 1):
+			self.Stages[i].Next	= self.Stages[i + 1]
+
+		self.__closed	= threading.Event()
+
+	def start(self):
+		for Stage in self.Stages:
+			Stage.start()
+
+		if self.StatusIntervalSec > 0:
+			threading.Thread(target=self.__report, name='pipeline-status', daemon=True).start()
+
+	def put(self, Item):
+		self.Stages[0].put(Item)
+
+	def abort(self):
+		# everything not transferred yet is dropped, the last stage finishes its work
+		for Stage in self.Stages[:-1]:
+			Stage.abort()
+
+	def close(self):
+		self.Stages[0].close()
+		self.__closed.set()
+
+	def status(self):
+		return(' | '.join(f'{Stage.Name}: {Stage.depth()} waiting, {Stage.Busy} busy, {Stage.Processed} done' for Stage in self.Stages))
+
+	def max_depths(self):
+		return(', '.join(f'{Stage.Name} {Stage.MaxDepth}' for Stage in self.Stages))
+
+	def __report(self):
+		while not self.__closed.wait(self.StatusIntervalSec):
+			print(f"Pipeline: {self.status()}")
+
+if __name__ == "__main__":
+	pass
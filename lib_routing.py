@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Target path of a file by its date and its category, compiled once from the config
+
+import os
+import string
+import sys
+
+# the layout of the archivist before templates existed
+DEFAULT_TEMPLATE	= '{year}/{year}-{month}/{year}-{month}-{day}/{subfolder}'
+
+# fields known by templates
+TEMPLATE_FIELDS	= ['year', 'month', 'day', 'hour', 'minute', 'second', 'category', 'subfolder', 'ext', 'camera_model']
+
+# categories of a group of files sharing a name, the first gives the date of the group
+AUTHORITY	= ['raw', 'heic', 'tif', 'web_images', 'video', 'audio', 'geo']
+
+# category of files belonging to another file, like xmp
+SIDECAR		= 'sidecar'
+
+# fields taken from the metadata of the file
+METADATA_FIELDS	= ['camera_model']
+
+# characters not allowed in folder names taken from metadata
+UNSAFE_CHARS	= str.maketrans({'/': '-', '\\': '-', '\0': ''})
+
+# folder for values missing in the metadata and for folder names not allowed
+UNKNOWN		= 'unknown'
+
+def parse_rules(Rules):
+	# 'category:ext,ext:subfolder;...' to [(category, [ext, ...], subfolder), ...]
+	Categories	= []
+
+	for Rule in Rules.split(';'):
+		if not Rule.strip():
+			continue
+
+		try:
+			Category, Extensions, Subfolder	= Rule.split(':', 2)
+		except ValueError:
+			print(f"Routing rule '{Rule}' ignored, expected 'category:ext,ext:subfolder'", file=sys.stderr)
+			continue
+
+		Categories.append((Category.strip(), Extensions.split(','), Subfolder.strip()))
+
+	return(Categories)
+
+class router(object):
+
+	def __init__(self, Categories, Template=DEFAULT_TEMPLATE):
+		# Categories: [(category, [ext, ...], subfolder), ...], later rules replace earlier ones for their extensions
+		# Template: path below the target, empty folder names are left out
+
+		# {ext: (category, subfolder)}
+		self.Extensions	= {}
+
+		for Category, Extensions, Subfolder in Categories:
+			for Extension in Extensions:
+				Extension	= Extension.strip().lower().lstrip('.')
+				if Extension:
+					self.Extensions[Extension]	= (Category, Subfolder)
+
+		# one format string per folder level: [(Level, FromMetadata), ...]
+		self.Levels	= []
+		Fields		= set()
+
+		for Level in Template.strip('/').split('/'):
+			LevelFields	= set()
+
+			for Literal, Field, FormatSpec, Conversion in string.Formatter().parse(Level):
+				if Field is None:
+					continue
+
+				if not Field in TEMPLATE_FIELDS:
+					sys.exit(f"Unknown field '{{{Field}}}' in path template '{Template}', known are: {', '.join(TEMPLATE_FIELDS)}")
+
+				LevelFields.add(Field)
+
+			Fields.update(LevelFields)
+			self.Levels.append((Level, bool(LevelFields.intersection(METADATA_FIELDS))))
+
+		# the camera model has to be read from the file
+		self.NeedsCameraModel	= 'camera_model' in Fields
+
+	def get_category(self, FilePathName):
+		# returns (category, subfolder), ('', '') if unknown
+		return(self.Extensions.get(os.path.splitext(FilePathName)[1][1:].lower(), ('', '')))
+
+	def get_authority(self, FilePathName):
+		# rank of a file in its group, lowest first, sidecars last
+		Category	= self.get_category(FilePathName)[0]
+
+		if Category == SIDECAR:
+			return(len(AUTHORITY) + 1)
+
+		return(AUTHORITY.index(Category) if Category in AUTHORITY else len(AUTHORITY))
+
+	def is_sidecar(self, FilePathName):
+		return(self.get_category(FilePathName)[0] == SIDECAR)
+
+	def get_path(self, FilePathName, fileobj):
+		Category, Subfolder	= self.get_category(FilePathName)
+
+		Values	= {
+			'year':			fileobj.year,
+			'month':		fileobj.month,
+			'day':			fileobj.day,
+			'hour':			fileobj.hour,
+			'minute':		fileobj.minute,
+			'second':		fileobj.second,
+			'category':		Category,
+			'subfolder':	Subfolder,
+			'ext':			os.path.splitext(FilePathName)[1][1:].lower(),
+			'camera_model':	fileobj.get_camera_model().translate(UNSAFE_CHARS).strip() if self.NeedsCameraModel else ''
+		}
+
+		Levels	= []
+		for Level, FromMetadata in self.Levels:
+			Level	= Level.format(**Values).strip()
+
+			# '.' and '..' would leave the layout, a missing value in the metadata gets its own folder
+			if Level in ['.', '..'] or (not Level and FromMetadata):
+				Level	= UNKNOWN
+
+			if Level:
+				Levels.append(Level)
+
+		return(os.path.join(*Levels) if Levels else '')
+
+if __name__ == "__main__":
+	pass
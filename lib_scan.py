@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Walks the source directory and yields media files as they are found
+
+import os
+import sys
+import time
+
+# directories changed more recently are not trusted to be unchanged on file systems with coarse timestamps
+SNAPSHOT_MIN_AGE_SEC	= 2
+
+class sourcefile(object):
+
+	def __init__(self, FilePathName, Stat):
+		self.FilePathName		= FilePathName
+
+		self.ModificationTime	= Stat.st_mtime
+		self.Size				= Stat.st_size
+		self.Inode				= Stat.st_ino
+		self.Device				= Stat.st_dev
+
+		# calculated if needed for the target index
+		self.QuickHash			= None
+
+		# other files of the group this file is the authoritative member of
+		self.Members			= []
+
+		# archived before, only part of a group to provide its date
+		self.Known				= False
+
+	def files(self):
+		return([self] + self.Members)
+
+class scanner(object):
+
+	def __init__(self, SourceDir, Extensions, ExcludeDirs=[], Snapshots=None, KnownFiles=None, Sidecars=None, Authority=None):
+		self.SourceDir	= SourceDir
+
+		# normalized once: lookup by lower case extension without dot
+		self.Extensions		= set(Extension.strip().lower() for Extension in Extensions if Extension.strip())
+		self.ExcludeDirs	= set(os.path.normpath(ExcludeDir) for ExcludeDir in ExcludeDirs)
+
+		# {DirPath: (ModificationTime, EntryCount)} of the last run, None for a full scan
+		self.Snapshots		= Snapshots
+
+		# function returning the set of already archived (FilePathName, ModificationTime) of a list
+		self.KnownFiles		= KnownFiles
+
+		# files of a folder with the same name are grouped if Authority is set: Authority(FilePathName) ranks the members, lowest first
+		# Sidecars: extensions of files belonging to a file with their name, like 'DSC0001.xmp' or 'DSC0001.ARW.xmp'
+		self.Sidecars		= set(Sidecar.strip().lower() for Sidecar in (Sidecars or []) if Sidecar.strip())
+		self.Authority		= Authority
+
+		# snapshots taken by this scan and directories which must be scanned again next time
+		self.NewSnapshots	= {}
+		self.DirtyDirs		= set()
+
+		self.DirsScanned	= 0
+		self.DirsSkipped	= 0
+		self.FilesFound		= 0
+		self.FilesKnown		= 0
+
+	def scan(self, Dirs=None):
+		# depth first, one directory listing in memory at a time
+		# Dirs: {DirPath: Recursive} known to be changed, scanned without looking at their snapshots, None: the whole source
+		if Dirs is None:
+			DirStack	= [(self.SourceDir, True)]
+		else:
+			DirStack	= list(reversed(Dirs.items()))
+
+		while DirStack:
+			DirPath, Recursive	= DirStack.pop()
+
+			try:
+				# stat before listing: changes during the listing make the snapshot outdated
+				DirModificationTime	= os.stat(DirPath).st_mtime
+
+				with os.scandir(DirPath) as Entries:
+					Entries	= list(Entries)
+			except OSError as e:
+				print(f"Can not read directory '{DirPath}': {e}", file=sys.stderr)
+				continue
+
+			Snapshot	= (DirModificationTime, len(Entries))
+			if time.time() - DirModificationTime >= SNAPSHOT_MIN_AGE_SEC:
+				self.NewSnapshots[DirPath]	= Snapshot
+
+			Unchanged	= (not self.Snapshots is None) and (self.Snapshots.get(DirPath) == Snapshot) and not (Dirs and DirPath in Dirs)
+
+			if Unchanged:
+				self.DirsSkipped	+= 1
+			else:
+				self.DirsScanned	+= 1
+
+			SubDirs	= []
+			Files	= []
+
+			for Entry in Entries:
+				try:
+					if Entry.is_dir(follow_symlinks=False):
+						if not os.path.normpath(Entry.path) in self.ExcludeDirs:
+							SubDirs.append(Entry.path)
+						continue
+
+					if Unchanged:
+						continue
+
+					if not Entry.is_file(follow_symlinks=False):
+						continue
+
+					if not os.path.splitext(Entry.name)[1][1:].lower() in self.Extensions:
+						continue
+
+					Files.append(sourcefile(Entry.path, Entry.stat(follow_symlinks=False)))
+				except OSError:
+					# vanished in the meantime
+					continue
+
+			self.FilesFound	+= len(Files)
+
+			# one lookup for all files of the folder
+			if Files and not self.KnownFiles is None:
+				Known	= self.KnownFiles([(File.FilePathName, File.ModificationTime) for File in Files])
+				if Known:
+					self.FilesKnown	+= len(Known)
+					for File in Files:
+						File.Known	= (File.FilePathName, File.ModificationTime) in Known
+
+			if not self.Authority is None:
+				Files	= self.__group(Files)
+
+			for File in Files:
+				# known groups are left out
+				if not all(Member.Known for Member in File.files()):
+					yield(File)
+
+			# keep the order of the listing
+			if Recursive:
+				DirStack	+= [(SubDir, True) for SubDir in reversed(SubDirs)]
+
+	def __group(self, Files):
+		# returns the authoritative member of every group in the order of the listing, the other files as its members
+		Groups	= {}
+
+		for File in Files:
+			Groups.setdefault(self.get_stem(File.FilePathName), []).append(File)
+
+		Leads	= []
+		for Members in Groups.values():
+			Members.sort(key=lambda File: self.Authority(File.FilePathName))
+
+			Lead			= Members[0]
+			Lead.Members	= Members[1:]
+			Leads.append(Lead)
+
+		return(Leads)
+
+	def get_stem(self, FilePathName):
+		Stem, Extension	= os.path.splitext(os.path.basename(FilePathName).lower())
+
+		# 'DSC0001.ARW.xmp' belongs to 'DSC0001.ARW'
+		if Extension[1:] in self.Sidecars:
+			Base, BaseExtension	= os.path.splitext(Stem)
+			if BaseExtension[1:] in self.Extensions:
+				Stem	= Base
+
+		return(Stem)
+
+	def mark_dirty(self, FilePathName):
+		# the file could not be finished, its directory has to be scanned again next time
+		self.DirtyDirs.add(os.path.dirname(FilePathName))
+
+	def get_snapshots(self):
+		return({DirPath: Snapshot for DirPath, Snapshot in self.NewSnapshots.items() if not DirPath in self.DirtyDirs})
+
+class settlequeue(object):
+	# files still being written: checked again until they reached their minimum age and did not change in between
+
+	def __init__(self, MinAgeSec, MaxWaitSec):
+		# MaxWaitSec: a file is given up this many seconds after it was put aside
+		self.MinAgeSec	= MinAgeSec
+		self.MaxWaitSec	= MaxWaitSec
+
+		# [(File, Deadline), ...]
+		self.__files	= []
+
+		# files not settled until their deadline
+		self.Expired	= []
+
+	def is_settled(self, File):
+		return(all(time.time() - Member.ModificationTime >= self.MinAgeSec for Member in File.files()))
+
+	def add(self, File):
+		self.__files.append((File, time.time() + self.MaxWaitSec))
+
+	def pending(self):
+		return(len(self.__files))
+
+	def files(self):
+		return([File for File, Deadline in self.__files])
+
+	def poll(self):
+		# returns the files settled since the last observation
+		Settled	= []
+		Waiting	= []
+
+		for File, Deadline in self.__files:
+			Unchanged	= True
+			Members		= []
+
+			for Member in File.files():
+				try:
+					Stat	= os.stat(Member.FilePathName)
+				except OSError:
+					# vanished
+					Unchanged	= False
+					continue
+
+				if (Stat.st_mtime, Stat.st_size) != (Member.ModificationTime, Member.Size):
+					Unchanged	= False
+
+					Known			= Member.Known
+					Member			= sourcefile(Member.FilePathName, Stat)
+					Member.Known	= Known
+
+				Members.append(Member)
+
+			if not Members:
+				continue
+
+			File			= Members[0]
+			File.Members	= Members[1:]
+
+			if Unchanged and self.is_settled(File):
+				Settled.append(File)
+			elif time.time() >= Deadline:
+				self.Expired.append(File)
+			else:
+				Waiting.append((File, Deadline))
+
+		self.__files	= Waiting
+
+		return(Settled)
+
+if __name__ == "__main__":
+	for File in scanner(sys.argv[1], sys.argv[2].split(';')).scan():
+		print(File.FilePathName)
@@ -128,6 +128,7 @@ class setup(object):
 					'conf_FILE_EXTENSIONS_LIST_VIDEO':				{'value': 'avi;lrv;mp4', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_LIST_AUDIO':				{'value': 'mp3;wav', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_LIST_GEO':				{'value': 'gpx', 'type' : 'str'},
+					'conf_FILE_EXTENSIONS_LIST_SIDECAR':			{'value': 'xmp;thm', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_SUBFOLDER_WEB_IMAGES':	{'value': '', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_SUBFOLDER_HEIC':			{'value': '', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_SUBFOLDER_RAW':			{'value': '', 'type' : 'str'},
@@ -135,8 +136,50 @@ class setup(object):
 					'conf_FILE_EXTENSIONS_SUBFOLDER_VIDEO':			{'value': '', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_SUBFOLDER_AUDIO':			{'value': '', 'type' : 'str'},
 					'conf_FILE_EXTENSIONS_SUBFOLDER_GEO':			{'value': 'GPX', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_WEB_IMAGES':			{'value': '', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_HEIC':					{'value': '', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_RAW':					{'value': '', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_TIF':					{'value': '', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_VIDEO':					{'value': 'fast', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_AUDIO':					{'value': '', 'type' : 'str'},
+					'conf_METADATA_STRATEGY_GEO':					{'value': '', 'type' : 'str'},
+					'conf_ROUTING_TEMPLATE':						{'value': '{year}/{year}-{month}/{year}-{month}-{day}/{subfolder}', 'type' : 'str'},
+					'conf_ROUTING_RULES':							{'value': '', 'type' : 'str'},
+					'conf_GROUP_FILES':								{'value': True, 'type' : 'bool'},
+					'conf_SCAN_INCREMENTAL':						{'value': True, 'type' : 'bool'},
+					'conf_SCAN_FULL_INTERVAL_HOURS':				{'value': 24, 'type' : 'int'},
+					'conf_WATCH_DEBOUNCE_SEC':						{'value': 2, 'type' : 'int'},
+					'conf_WATCH_RECONCILE_MIN':						{'value': 60, 'type' : 'int'},
+					'conf_WATCH_POLL_SEC':							{'value': 30, 'type' : 'int'},
 					'conf_DB_MIN_IDLE_SEC':							{'value': 15, 'type' : 'int'},
+					'conf_DB_JOURNAL_MODE':							{'value': 'WAL', 'type' : 'str'},
+					'conf_DB_SYNCHRONOUS':							{'value': 'NORMAL', 'type' : 'str'},
+					'conf_DB_COMMIT_FILES':							{'value': 500, 'type' : 'int'},
+					'conf_DB_COMMIT_SEC':							{'value': 5, 'type' : 'int'},
+					'conf_MULTI_WORKER':							{'value': False, 'type' : 'bool'},
+					'conf_LEASE_SEC':								{'value': 600, 'type' : 'int'},
+					'conf_LEASE_BATCH':								{'value': 50, 'type' : 'int'},
 					'conf_MIN_MEDIA_FILE_AGE_SEC':					{'value': 10, 'type' : 'int'},
+					'conf_RUN_DEADLINE_SEC':						{'value': 300, 'type' : 'int'},
+					'conf_FILENAME_DATES_HIGH_TRUST':				{'value': 'archivist;camera;samsung;screenshot;signal', 'type' : 'str'},
+					'conf_FILENAME_DATES_LOW_TRUST':				{'value': 'pixel;whatsapp', 'type' : 'str'},
+					'conf_METADATA_NATIVE':							{'value': True, 'type' : 'bool'},
+					'conf_EXIFTOOL_WORKERS':						{'value': 2, 'type' : 'int'},
+					'conf_EXIFTOOL_TIMEOUT_SEC':					{'value': 30, 'type' : 'int'},
+					'conf_TARGET_INDEX':							{'value': True, 'type' : 'bool'},
+					'conf_DEDUP':									{'value': False, 'type' : 'bool'},
+					'conf_DEDUP_ACTION':							{'value': 'skip', 'type' : 'str'},
+					'conf_COPY_METHODS':							{'value': 'reflink;copy_file_range;copy', 'type' : 'str'},
+					'conf_VERIFY_TRANSFER':							{'value': False, 'type' : 'bool'},
+					'conf_RESUME_MIN_SIZE_MB':						{'value': 256, 'type' : 'int'},
+					'conf_METADATA_WORKERS':						{'value': 2, 'type' : 'int'},
+					'conf_TRANSFER_WORKERS':						{'value': 4, 'type' : 'int'},
+					'conf_TRANSFER_SOURCE_DEVICE_LIMIT':			{'value': 2, 'type' : 'int'},
+					'conf_TRANSFER_TARGET_DEVICE_LIMIT':			{'value': 2, 'type' : 'int'},
+					'conf_PIPELINE_QUEUE_SIZE':						{'value': 100, 'type' : 'int'},
+					'conf_PIPELINE_STATUS_SEC':						{'value': 0, 'type' : 'int'},
+					'conf_TRANSFER_ORDER':							{'value': 'scan', 'type' : 'str'},
+					'conf_TRANSFER_ORDER_WINDOW':					{'value': 200, 'type' : 'int'},
 					'conf_EXEC_SCRIPT_IF_SUCCESS':					{'value': 'echo "It worked."; echo "Replace this by whatever you need!"', 'type' : 'str'},
 					'conf_MAIL_HTML':								{'value': True, 'type' : 'bool'},
 					'conf_SMTP_SERVER':								{'value': '', 'type' : 'str'},
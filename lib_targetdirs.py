@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Folders at the target and their contents, read once per run: one listing per folder instead of a request per file
+
+import errno
+import os
+import sys
+
+class targetdirs(object):
+	# used by the route stage only, changes by other programs during the run are not seen
+
+	def __init__(self):
+		# {DirPath: (Device, set of names)}, None for folders not existing
+		self.__dirs	= {}
+
+		self.DirsListed	= 0
+
+	def isdir(self, DirPath):
+		return(not self.__get(DirPath) is None)
+
+	def device(self, DirPath):
+		return(self.__get(DirPath)[0])
+
+	def exists(self, FilePathName):
+		Dir	= self.__get(os.path.dirname(FilePathName))
+		return((not Dir is None) and os.path.basename(FilePathName) in Dir[1])
+
+	def add(self, FilePathName):
+		# a file of this run will be there
+		Dir	= self.__get(os.path.dirname(FilePathName))
+		if not Dir is None:
+			Dir[1].add(os.path.basename(FilePathName))
+
+	def remove(self, FilePathName):
+		# a file moved away
+		Dir	= self.__get(os.path.dirname(FilePathName))
+		if not Dir is None:
+			Dir[1].discard(os.path.basename(FilePathName))
+
+	def makedirs(self, DirPath):
+		# returns the folders created, top down
+		CreatedDirs	= []
+
+		Path	= DirPath
+		while not self.isdir(Path):
+			CreatedDirs.insert(0, Path)
+			Path	= os.path.dirname(Path)
+
+		os.makedirs(DirPath, exist_ok=True)
+
+		for CreatedDir in CreatedDirs:
+			self.add(CreatedDir)
+			self.__dirs[CreatedDir]	= (os.stat(CreatedDir).st_dev, set())
+
+		return(CreatedDirs)
+
+	def __get(self, DirPath):
+		if not DirPath in self.__dirs:
+			self.__dirs[DirPath]	= self.__list(DirPath)
+
+		return(self.__dirs[DirPath])
+
+	def __list(self, DirPath):
+		# one open, one stat and the listing of the folder
+		try:
+			DirFd	= os.open(DirPath, os.O_RDONLY | os.O_DIRECTORY)
+		except OSError as e:
+			if not e.errno in [errno.ENOENT, errno.ENOTDIR]:
+				print(f"Can not read folder '{DirPath}': {e}", file=sys.stderr)
+			return(None)
+
+		try:
+			Device	= os.fstat(DirFd).st_dev
+
+			with os.scandir(DirFd) as Entries:
+				Names	= set(Entry.name for Entry in Entries)
+		finally:
+			os.close(DirFd)
+
+		self.DirsListed	+= 1
+
+		return((Device, Names))
+
+if __name__ == "__main__":
+	pass
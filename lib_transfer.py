@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Transfers files, called by the workers of the transfer stage with limits per source and target device
+
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import sys
+import threading
+
+import lib_dedup
+
+# ioctl of Linux to clone a file on btrfs, XFS and others (copy on write)
+FICLONE	= 0x40049409
+
+# known copy methods, tried in the configured order
+COPY_METHODS	= ['reflink', 'copy_file_range', 'hardlink', 'copy']
+
+# block size of verified and resumable copies
+COPY_BLOCK_SIZE	= 1048576
+
+# resumable copies are synced and their offset is saved after this many bytes
+RESUME_CHECKPOINT_BYTES	= 67108864
+
+# bytes before a saved offset compared with the source before resuming
+RESUME_CHECK_BYTES	= 1048576
+
+# errors meaning a method is not supported for these files: try the next one
+UNSUPPORTED_ERRNOS	= [errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EPERM, errno.EMLINK]
+
+# methods not reading the data of a file
+NO_DATA_METHODS	= ['rename', 'hardlink', 'reflink']
+
+# keys of the transfer order, 'scan' keeps the order of the scan
+ORDER_POLICIES	= {
+	'scan':				None,
+	# one target folder after the other, in the order of the files on the source
+	'destination':		lambda Job: (os.path.dirname(Job.TargetFilePathName), Job.SourceFile.Device, Job.SourceFile.Inode),
+	# in the order of the files on the source disk
+	'source-inode':		lambda Job: (Job.SourceFile.Device, Job.SourceFile.Inode),
+	# large files first: no large file is left for the end of the run
+	'size-descending':	lambda Job: -Job.SourceFile.Size
+}
+
+def order_key(Job, Policy):
+	# None for files waiting for another file: all files before are passed on first
+	for Member in [Job] + Job.Group:
+		if not Member.Predecessor is None:
+			return(None)
+
+	return(ORDER_POLICIES[Policy](Job))
+
+class devicelimits(object):
+	# semaphores per device, 0 means unlimited
+
+	def __init__(self, SourceLimit=0, TargetLimit=0):
+		self.SourceLimit	= SourceLimit
+		self.TargetLimit	= TargetLimit
+
+		self.__source	= {}
+		self.__target	= {}
+		self.__lock		= threading.Lock()
+
+	def __get(self, Semaphores, Device, Limit):
+		if Limit <= 0:
+			return(None)
+
+		with self.__lock:
+			if not Device in Semaphores:
+				Semaphores[Device]	= threading.Semaphore(Limit)
+
+			return(Semaphores[Device])
+
+	def acquire(self, SourceDevice, TargetDevice):
+		# always source before target: no deadlocks between workers
+		Semaphores	= [
+			self.__get(self.__source, SourceDevice, self.SourceLimit),
+			self.__get(self.__target, TargetDevice, self.TargetLimit)
+		]
+		Semaphores	= [Semaphore for Semaphore in Semaphores if not Semaphore is None]
+
+		for Semaphore in Semaphores:
+			Semaphore.acquire()
+
+		return(Semaphores)
+
+	def release(self, Semaphores):
+		for Semaphore in reversed(Semaphores):
+			Semaphore.release()
+
+class job(object):
+
+	def __init__(self, SourceFile, TargetFilePathName, TargetDevice, fileobj, Predecessor=None):
+		self.SourceFile			= SourceFile
+		self.TargetFilePathName	= TargetFilePathName
+		self.TargetDevice		= TargetDevice
+		self.fileobj			= fileobj
+
+		# job transferring to the same target before, has to finish first
+		self.Predecessor		= Predecessor
+
+		# False: target exists and must not be overwritten, only recorded
+		self.Transfer	= True
+
+		# target file with the same content: nothing to copy
+		self.DuplicateOf	= None
+
+		self.Done		= threading.Event()
+		self.Success	= False
+
+		# taken by a transfer worker: Done will be set
+		self.Started	= False
+
+		# hash of the data written by a verified transfer
+		self.Checksum	= None
+
+		# jobs of the other files of the group, transferred after this one by the same worker
+		self.Group		= []
+
+	def drop(self):
+		# not transferred because of an abort: jobs waiting for this one go on
+		for Member in [self] + self.Group:
+			if not Member.Done.is_set():
+				Member.Success	= False
+				Member.Done.set()
+
+class transfer(object):
+
+	def __init__(self, Move, Limits, Permissions, CopyMethods=['copy'], DedupAction='skip', Verify=False, Journal=None, ResumeMinSize=0, Replace=True):
+		self.Move			= Move
+		self.Limits			= Limits
+		self.Permissions	= Permissions
+		self.DedupAction	= DedupAction
+
+		# False: files landing on an existing file fail, for other processes writing to the target
+		self.Replace		= Replace
+
+		# every copied byte is hashed and compared with the data on the disk before the source is removed
+		self.Verify			= Verify
+
+		# lib_database.database keeping the offsets of files at least ResumeMinSize large, None: not resumable
+		self.Journal		= Journal
+		self.ResumeMinSize	= ResumeMinSize
+
+		self.CopyMethods	= [Method for Method in CopyMethods if Method in COPY_METHODS]
+		if not 'copy' in self.CopyMethods:
+			# last resort
+			self.CopyMethods.append('copy')
+
+		# number of files per method used
+		self.MethodsUsed	= {}
+
+		# bytes of the files whose data was copied
+		self.BytesCopied	= 0
+		self.__lock			= threading.Lock()
+
+	def run(self, Job):
+		# called by the transfer workers, returns True on success
+		Job.Started	= True
+
+		try:
+			if not Job.Predecessor is None:
+				Job.Predecessor.Done.wait()
+
+			# a duplicate of a file of this run which failed is transferred itself
+			if not Job.DuplicateOf is None and (Job.Predecessor is None or Job.Predecessor.Success):
+				self.__duplicate(Job)
+
+				Job.Success	= True
+				return(Job.Success)
+
+			Semaphores	= self.Limits.acquire(Job.SourceFile.Device, Job.TargetDevice)
+			try:
+				self.__transfer(Job)
+			finally:
+				self.Limits.release(Semaphores)
+
+			self.Permissions.apply(Job.TargetFilePathName)
+
+			Job.Success	= True
+
+		except Exception as e:
+			print(f"Error transferring '{Job.SourceFile.FilePathName}' to '{Job.TargetFilePathName}': {e}", file=sys.stderr)
+
+		finally:
+			Job.Done.set()
+
+		return(Job.Success)
+
+	def __transfer(self, Job):
+		MediaFilePath		= Job.SourceFile.FilePathName
+		TargetFilePathName	= Job.TargetFilePathName
+
+		if self.Move:
+			print(f"move '{MediaFilePath}' to '{TargetFilePathName}'")
+			Method	= self.__move(Job)
+		else:
+			print(f"copy '{MediaFilePath}' to '{TargetFilePathName}'")
+			Method	= self.__copy(Job, self.CopyMethods)
+
+		self.__count(Method, 0 if Method in NO_DATA_METHODS else Job.SourceFile.Size)
+
+	def __duplicate(self, Job):
+		MediaFilePath	= Job.SourceFile.FilePathName
+
+		# the source is the last copy if the file at the target changed since it was compared
+		if self.Move and lib_dedup.full_hash(Job.DuplicateOf) != lib_dedup.full_hash(MediaFilePath):
+			raise OSError(errno.EIO, f"'{Job.DuplicateOf}' differs from '{MediaFilePath}' now, source kept")
+
+		if self.DedupAction == 'hardlink' and Job.TargetFilePathName != Job.DuplicateOf:
+			print(f"link '{Job.TargetFilePathName}' to '{Job.DuplicateOf}', duplicate of '{MediaFilePath}'")
+			link_file(Job.DuplicateOf, Job.TargetFilePathName)
+			Method	= 'duplicate hardlink'
+		else:
+			print(f"skip '{MediaFilePath}', duplicate of '{Job.DuplicateOf}'")
+			Method	= 'duplicate'
+
+		if self.Move:
+			os.unlink(MediaFilePath)
+
+		self.__count(Method)
+
+	def __count(self, Method, Bytes=0):
+		with self.__lock:
+			self.MethodsUsed[Method]	= self.MethodsUsed.get(Method, 0) + 1
+			self.BytesCopied			+= Bytes
+
+	def __copy(self, Job, Methods):
+		# copies to a temporary name first: an interrupted copy never looks like a complete file at the target
+		Source	= Job.SourceFile.FilePathName
+		Temp	= temp_name(Job.TargetFilePathName, Source)
+
+		Resumable	= (not self.Journal is None) and Job.SourceFile.Size >= self.ResumeMinSize
+
+		try:
+			Method	= None
+			Offset	= self.__resume_offset(Job, Temp) if Resumable else 0
+
+			if not Offset:
+				create_temp(Temp)
+
+			if not self.Verify:
+				if not Resumable:
+					Method	= copy_file(Source, Temp, Methods)
+				elif not Offset:
+					# methods not copying the data through user space first, the resumable copy only instead of 'copy'
+					try:
+						Method	= copy_file(Source, Temp, [Method for Method in Methods if Method != 'copy'])
+					except OSError as e:
+						if not e.errno in UNSUPPORTED_ERRNOS:
+							raise
+
+			if Method is None:
+				Checkpoint	= (lambda Offset: self.Journal.dbSetTransfer(Source, Job.SourceFile.ModificationTime, Job.SourceFile.Size, Temp, Offset)) if Resumable else None
+
+				if Offset:
+					print(f"resuming at {Offset} of {Job.SourceFile.Size} bytes")
+
+				Job.Checksum	= copy_blocks(Source, Temp, Offset, Checkpoint, self.Verify)
+				Method			= 'verified copy' if self.Verify else 'resumable copy'
+
+			if self.Move:
+				shutil.copystat(Source, Temp)
+			else:
+				shutil.copymode(Source, Temp)
+
+			place_file(Temp, Job.TargetFilePathName, self.Replace)
+
+		except:
+			# a resumable copy keeps its data for the next attempt
+			if not Resumable and os.path.lexists(Temp):
+				os.unlink(Temp)
+			raise
+
+		if Resumable:
+			self.Journal.dbRemoveTransfer(Source)
+
+		return(Method)
+
+	def __resume_offset(self, Job, Temp):
+		# offset saved by an interrupted run if the data before it is still the same, else 0
+		Source	= Job.SourceFile.FilePathName
+
+		Entry	= self.Journal.dbGetTransfer(Source)
+
+		Offset	= 0
+		if not Entry is None:
+			TempPath, SavedOffset, ModificationTime, Size	= Entry
+
+			if TempPath == Temp and SavedOffset and (ModificationTime, Size) == (Job.SourceFile.ModificationTime, Job.SourceFile.Size):
+				try:
+					if os.path.getsize(Temp) >= SavedOffset and same_range(Source, Temp, max(0, SavedOffset - RESUME_CHECK_BYTES), SavedOffset):
+						Offset	= SavedOffset
+				except OSError:
+					pass
+
+			elif TempPath != Temp:
+				# the target name changed since: the data of the old name is not used any more
+				try:
+					os.unlink(TempPath)
+				except OSError:
+					pass
+
+		if not Offset:
+			self.Journal.dbSetTransfer(Source, Job.SourceFile.ModificationTime, Job.SourceFile.Size, Temp, 0)
+
+		return(Offset)
+
+	def __move(self, Job):
+		# like shutil.move: rename if possible, else copy with metadata and remove the source
+		Source	= Job.SourceFile.FilePathName
+		Target	= Job.TargetFilePathName
+
+		try:
+			place_file(Source, Target, self.Replace)
+			return('rename')
+		except OSError as e:
+			if e.errno != errno.EXDEV:
+				raise
+
+		# a hard link can not cross file systems
+		Method	= self.__copy(Job, [Method for Method in self.CopyMethods if Method != 'hardlink'])
+		os.unlink(Source)
+
+		return(Method)
+
+def copy_file(Source, Target, Methods):
+	# copies the data by the first method working, returns the name of the method
+	# Target: created by create_temp, written into or replaced by a hard link
+	for Method in Methods:
+		try:
+			if Method == 'reflink':
+				with open(Source, 'rb') as fSource, open(Target, 'wb') as fTarget:
+					fcntl.ioctl(fTarget.fileno(), FICLONE, fSource.fileno())
+
+			elif Method == 'copy_file_range':
+				copy_file_range(Source, Target)
+
+			elif Method == 'hardlink':
+				link_file(Source, Target)
+
+			else:
+				shutil.copyfile(Source, Target)
+
+			return(Method)
+
+		except OSError as e:
+			if Method == 'copy' or not e.errno in UNSUPPORTED_ERRNOS:
+				raise
+
+	raise OSError(errno.ENOSYS, f"no copy method worked: {', '.join(Methods)}")
+
+def place_file(Source, Target, Replace=True):
+	# renames Source to Target, Replace=False: raises FileExistsError if Target exists, also if created by another process
+	if Replace:
+		os.replace(Source, Target)
+		return
+
+	try:
+		os.link(Source, Target)
+	except OSError as e:
+		if not e.errno in UNSUPPORTED_ERRNOS or e.errno == errno.EXDEV:
+			raise
+
+		# no hard links on this file system: not atomic
+		if os.path.lexists(Target):
+			raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), Target)
+
+		os.replace(Source, Target)
+		return
+
+	os.unlink(Source)
+
+def link_file(Source, Target):
+	# link to a temporary name: an existing target is replaced atomically
+	TempLink	= f'{Target}.archivist-link'
+	os.link(Source, TempLink)
+	try:
+		os.replace(TempLink, Target)
+	except:
+		os.unlink(TempLink)
+		raise
+
+def temp_name(Target, Source):
+	# hidden and without media extension: never scanned or indexed
+	# the same for every attempt of a source file, different for other files going to the same target (multi-worker mode)
+	SourceHash	= hashlib.blake2b(os.fsencode(Source), digest_size=8).hexdigest()
+	return(os.path.join(os.path.dirname(Target), f'.{os.path.basename(Target)}.{SourceHash}.archivist-part'))
+
+def create_temp(Temp):
+	# a new empty file: an existing one may be a hard link of another file, never write into it
+	if os.path.lexists(Temp):
+		os.unlink(Temp)
+
+	# fails if another process created it in the meantime
+	os.close(os.open(Temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+
+def copy_blocks(Source, Target, Offset=0, Checkpoint=None, Verify=False):
+	# copies block by block from Offset, calls Checkpoint(Offset) whenever the data up to Offset is synced
+	# Verify: the source is hashed while copying, the target is read back from the disk and compared, returns the hash
+	# Target: created by create_temp or the file of an interrupted copy
+	Hash	= hashlib.blake2b() if Verify else None
+
+	with open(Source, 'rb') as fSource, open(Target, 'r+b') as fTarget:
+		# anything written after the last checkpoint is not trusted
+		fTarget.truncate(Offset)
+		fTarget.seek(Offset)
+
+		if Offset:
+			if Verify:
+				while fSource.tell() < Offset:
+					Hash.update(fSource.read(min(COPY_BLOCK_SIZE, Offset - fSource.tell())))
+			else:
+				fSource.seek(Offset)
+
+		Synced	= Offset
+
+		while True:
+			Block	= fSource.read(COPY_BLOCK_SIZE)
+			if not Block:
+				break
+
+			if Verify:
+				Hash.update(Block)
+			fTarget.write(Block)
+
+			Offset	+= len(Block)
+
+			if not Checkpoint is None and Offset - Synced >= RESUME_CHECKPOINT_BYTES:
+				fTarget.flush()
+				os.fsync(fTarget.fileno())
+				Checkpoint(Offset)
+				Synced	= Offset
+
+		fTarget.flush()
+		os.fsync(fTarget.fileno())
+
+		# written data is still in the page cache: drop it to compare with what is on the disk
+		if Verify:
+			try:
+				os.posix_fadvise(fTarget.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+			except (AttributeError, OSError):
+				pass
+
+	if not Verify:
+		return(None)
+
+	Checksum	= Hash.hexdigest()
+
+	if lib_dedup.full_hash(Target) != Checksum:
+		os.unlink(Target)
+		raise OSError(errno.EIO, f"verification failed, written data differs from '{Source}'")
+
+	return(Checksum)
+
+def same_range(Source, Target, Start, End):
+	with open(Source, 'rb') as fSource, open(Target, 'rb') as fTarget:
+		fSource.seek(Start)
+		fTarget.seek(Start)
+
+		return(fSource.read(End - Start) == fTarget.read(End - Start))
+
+def copy_file_range(Source, Target):
+	# copy inside the kernel, no data through user space
+	with open(Source, 'rb') as fSource, open(Target, 'wb') as fTarget:
+		Size	= os.fstat(fSource.fileno()).st_size
+		Copied	= 0
+
+		while Copied < Size:
+			try:
+				Count	= os.copy_file_range(fSource.fileno(), fTarget.fileno(), Size - Copied)
+			except AttributeError:
+				# Python < 3.8 or not Linux
+				raise OSError(errno.ENOSYS, 'copy_file_range not available')
+			except OSError:
+				if Copied:
+					raise OSError(errno.EIO, 'copy_file_range failed after partial copy')
+				raise
+
+			if Count == 0:
+				# end of file before Size: not supported for this file or changed while copying
+				if not Copied:
+					raise OSError(errno.ENOSYS, 'copy_file_range copied no data')
+				raise OSError(errno.EIO, f"copy_file_range stopped after {Copied} of {Size} bytes")
+
+			Copied	+= Count
+
+		if Copied != Size:
+			raise OSError(errno.EIO, f"copy_file_range copied {Copied} of {Size} bytes")
+
+if __name__ == "__main__":
+	pass
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Waits for changes in the source directory: inotify on Linux, polling elsewhere
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify events, see inotify(7)
+IN_CLOSE_WRITE	= 0x00000008
+IN_MOVED_TO		= 0x00000080
+IN_CREATE		= 0x00000100
+IN_DELETE_SELF	= 0x00000400
+IN_MOVE_SELF	= 0x00000800
+IN_Q_OVERFLOW	= 0x00004000
+IN_IGNORED		= 0x00008000
+IN_ONLYDIR		= 0x01000000
+IN_ISDIR		= 0x40000000
+
+WATCH_MASK		= IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# struct inotify_event: wd, mask, cookie, len, name
+EVENT_HEADER	= struct.Struct('iIII')
+
+# a burst of changes is handled in parts after this many debounce intervals
+MAX_DEBOUNCE_INTERVALS	= 10
+
+class watcher(object):
+
+	def __init__(self, SourceDir, Extensions, ExcludeDirs=[], PollSec=30):
+		self.SourceDir		= SourceDir
+		self.Extensions		= set(Extension.strip().lower() for Extension in Extensions if Extension.strip())
+		self.ExcludeDirs	= set(os.path.normpath(ExcludeDir) for ExcludeDir in ExcludeDirs)
+		self.PollSec		= PollSec
+
+		# {wd: DirPath}
+		self.__watches	= {}
+		self.__fd		= None
+
+		try:
+			self.__start()
+		except (OSError, AttributeError) as e:
+			# no inotify or not enough watches: the caller scans every PollSec
+			self.close()
+			print(f"inotify not available ({e}), polling every {self.PollSec} seconds.", file=sys.stderr)
+
+	def inotify(self):
+		return(not self.__fd is None)
+
+	def wait(self, Timeout, DebounceSec):
+		# returns {DirPath: Recursive} of the folders changed, {} if there was no change within Timeout,
+		# None if the whole source has to be scanned (polling, lost events)
+		if self.__fd is None:
+			time.sleep(max(0, min(Timeout, self.PollSec)))
+			return(None)
+
+		Dirs	= {}
+
+		if self.__read(Dirs, Timeout) is None:
+			return(None)
+
+		# collect until it is quiet for DebounceSec
+		Deadline	= time.time() + DebounceSec * MAX_DEBOUNCE_INTERVALS
+		while Dirs and time.time() < Deadline:
+			Events	= self.__read(Dirs, min(DebounceSec, Deadline - time.time()))
+
+			if Events is None:
+				return(None)
+
+			if Events == 0:
+				break
+
+		return(Dirs)
+
+	def close(self):
+		if not self.__fd is None:
+			os.close(self.__fd)
+
+		self.__fd		= None
+		self.__watches	= {}
+
+	def __start(self):
+		libc	= ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+		self.__add_watch_function	= libc.inotify_add_watch
+		self.__add_watch_function.argtypes	= [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+		self.__rm_watch_function	= libc.inotify_rm_watch
+		self.__rm_watch_function.argtypes	= [ctypes.c_int, ctypes.c_int]
+
+		Fd	= libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if Fd < 0:
+			Errno	= ctypes.get_errno()
+			raise OSError(Errno, os.strerror(Errno))
+
+		self.__fd	= Fd
+
+		self.__add_tree(self.SourceDir)
+
+	def __add_tree(self, DirPath):
+		# watches a folder and its subfolders
+		for Path, SubDirs, Files in os.walk(DirPath):
+			SubDirs[:]	= [SubDir for SubDir in SubDirs if not os.path.normpath(os.path.join(Path, SubDir)) in self.ExcludeDirs]
+			self.__add_watch(Path)
+
+	def __add_watch(self, DirPath):
+		Wd	= self.__add_watch_function(self.__fd, os.fsencode(DirPath), WATCH_MASK)
+
+		if Wd < 0:
+			Errno	= ctypes.get_errno()
+			if Errno in [errno.ENOENT, errno.ENOTDIR]:
+				# vanished in the meantime
+				return
+
+			raise OSError(Errno, f"{os.strerror(Errno)}: '{DirPath}'")
+
+		self.__watches[Wd]	= DirPath
+
+	def __remove_tree(self, DirPath):
+		for Wd, Path in list(self.__watches.items()):
+			if Path == DirPath or Path.startswith(DirPath + os.sep):
+				self.__rm_watch_function(self.__fd, Wd)
+				del self.__watches[Wd]
+
+	def __read(self, Dirs, Timeout):
+		# adds the changes within Timeout to Dirs, returns the number of events or None if events were lost
+		if not select.select([self.__fd], [], [], max(0, Timeout))[0]:
+			return(0)
+
+		try:
+			Data	= os.read(self.__fd, 65536)
+		except BlockingIOError:
+			return(0)
+
+		Events	= 0
+		Offset	= 0
+		while Offset + EVENT_HEADER.size <= len(Data):
+			Wd, Mask, Cookie, Length	= EVENT_HEADER.unpack_from(Data, Offset)
+			Name	= os.fsdecode(Data[Offset + EVENT_HEADER.size:Offset + EVENT_HEADER.size + Length].rstrip(b'\0'))
+			Offset	+= EVENT_HEADER.size + Length
+			Events	+= 1
+
+			if Mask & IN_Q_OVERFLOW:
+				return(None)
+
+			DirPath	= self.__watches.get(Wd)
+			if DirPath is None:
+				continue
+
+			if Mask & IN_IGNORED:
+				del self.__watches[Wd]
+				continue
+
+			if Mask & IN_DELETE_SELF:
+				continue
+
+			if Mask & IN_MOVE_SELF:
+				# moved within the source: IN_MOVED_TO has watched it under its new path before
+				if os.path.isdir(DirPath):
+					continue
+
+				# moved away: its path and the paths of its subfolders are wrong
+				self.__remove_tree(DirPath)
+				return(None)
+
+			Path	= os.path.join(DirPath, Name)
+
+			if Mask & IN_ISDIR:
+				if os.path.normpath(Path) in self.ExcludeDirs:
+					continue
+
+				# new folder: watched from now on, files written before are found by the scan
+				try:
+					self.__add_tree(Path)
+				except OSError as e:
+					print(f"Can not watch '{Path}': {e}", file=sys.stderr)
+
+					if e.errno == errno.ENOSPC:
+						# out of watches: the folder would be missed, poll from now on
+						self.close()
+						print(f"Polling every {self.PollSec} seconds.", file=sys.stderr)
+
+					return(None)
+
+				Dirs[Path]	= True
+			elif os.path.splitext(Name)[1][1:].lower() in self.Extensions:
+				# the database and other files in the source do not count
+				Dirs.setdefault(DirPath, False)
+
+		return(Events)
+
+if __name__ == "__main__":
+	# prints the changes: python3 lib_watch.py DIR EXT[;EXT...]
+	Watcher	= watcher(sys.argv[1], sys.argv[2].split(';'))
+	while True:
+		print(Watcher.wait(60, 1))
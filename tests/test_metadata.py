@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# Author: Stefan Saam, github@saams.de
+
+#######################################################################
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+# Native metadata reader: small files built here for every container, compared with exiftool if installed
+# python3 -m unittest discover tests
+
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib_metadata
+
+DATE_ORIGINAL	= '2023:07:14 10:20:30'
+DATE_CREATE		= '2023:07:14 10:20:31'
+MODEL			= 'Test Camera'
+
+# 2023:07:14 10:20:30 in seconds since 1904-01-01
+QUICKTIME_DATE	= 3772174830
+QUICKTIME_DATE_TEXT	= '2023:07:14 10:20:30'
+
+def box(BoxType, Payload):
+	return(struct.pack('>I4s', 8 + len(Payload), BoxType) + Payload)
+
+def tiff(Endian='<', Model=MODEL, DateTimeOriginal=DATE_ORIGINAL, CreateDate=DATE_CREATE):
+	# IFD0 with Model and the EXIF IFD, EXIF IFD with both dates, values after the IFDs
+	ByteOrder	= b'II' if Endian == '<' else b'MM'
+
+	ModelValue	= Model.encode('ascii') + b'\x00'
+	Dates		= [(lib_metadata.TIFF_TAG_DATETIMEORIGINAL, DateTimeOriginal), (lib_metadata.TIFF_TAG_CREATEDATE, CreateDate)]
+
+	IFD0Offset	= 8
+	IFD0Size	= 2 + 2 * 12 + 4
+	ExifOffset	= IFD0Offset + IFD0Size
+	ExifSize	= 2 + len(Dates) * 12 + 4
+	ValueOffset	= ExifOffset + ExifSize
+
+	Values	= b''
+
+	IFD0	= struct.pack(f'{Endian}H', 2)
+	IFD0	+= struct.pack(f'{Endian}HHII', lib_metadata.TIFF_TAG_MODEL, 2, len(ModelValue), ValueOffset + len(Values))
+	Values	+= ModelValue
+	IFD0	+= struct.pack(f'{Endian}HHII', lib_metadata.TIFF_TAG_EXIF_IFD, 4, 1, ExifOffset)
+	IFD0	+= struct.pack(f'{Endian}I', 0)
+
+	Exif	= struct.pack(f'{Endian}H', len(Dates))
+	for Tag, Date in Dates:
+		DateValue	= Date.encode('ascii') + b'\x00'
+		Exif	+= struct.pack(f'{Endian}HHII', Tag, 2, len(DateValue), ValueOffset + len(Values))
+		Values	+= DateValue
+	Exif	+= struct.pack(f'{Endian}I', 0)
+
+	Magic	= struct.pack(f'{Endian}H', 42)
+
+	return(ByteOrder + Magic + struct.pack(f'{Endian}I', IFD0Offset) + IFD0 + Exif + Values)
+
+def jpeg(Tiff=None):
+	Tiff	= tiff() if Tiff is None else Tiff
+	App1	= b'Exif\x00\x00' + Tiff
+
+	# a JFIF segment before the EXIF segment
+	App0	= b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+
+	return(b'\xff\xd8' + b'\xff\xe0' + struct.pack('>H', 2 + len(App0)) + App0 + b'\xff\xe1' + struct.pack('>H', 2 + len(App1)) + App1 + b'\xff\xd9')
+
+def mp4(CreationTime=QUICKTIME_DATE, Version=0):
+	if Version == 1:
+		Mvhd	= bytes([1, 0, 0, 0]) + struct.pack('>QQIQ', CreationTime, CreationTime, 1000, 0) + bytes(80)
+	else:
+		Mvhd	= bytes(4) + struct.pack('>IIII', CreationTime, CreationTime, 1000, 0) + bytes(80)
+
+	return(box(b'ftyp', b'isom' + bytes(4) + b'isomiso2mp41') + box(b'moov', box(b'mvhd', Mvhd)))
+
+def heic():
+	ExifItem	= struct.pack('>I', 6) + b'Exif\x00\x00' + tiff('>')
+
+	Infe	= box(b'infe', bytes([2, 0, 0, 0]) + struct.pack('>HH', 1, 0) + b'Exif' + b'\x00')
+	Iinf	= box(b'iinf', bytes(4) + struct.pack('>H', 1) + Infe)
+
+	def meta(ExifOffset):
+		# iloc version 0: offset and length 4 bytes, no base offset
+		Iloc	= box(b'iloc', bytes(4) + bytes([0x44, 0x00]) + struct.pack('>HHHHII', 1, 1, 0, 1, ExifOffset, len(ExifItem)))
+		return(box(b'meta', bytes(4) + box(b'hdlr', bytes(8) + b'pict' + bytes(13)) + Iinf + Iloc))
+
+	Ftyp	= box(b'ftyp', b'heic' + bytes(4) + b'mif1heic')
+
+	# the offset of the item depends on the size of meta, which does not depend on the offset
+	ExifOffset	= len(Ftyp) + len(meta(0)) + 8
+
+	return(Ftyp + meta(ExifOffset) + box(b'mdat', ExifItem))
+
+class test_metadata(unittest.TestCase):
+
+	def setUp(self):
+		self.Dir	= tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.Dir)
+
+	def write(self, Name, Data):
+		FilePathName	= os.path.join(self.Dir, Name)
+		with open(FilePathName, 'wb') as f:
+			f.write(Data)
+
+		return(FilePathName)
+
+	def assertExifTags(self, Tags):
+		self.assertEqual(Tags, {'Model': MODEL, 'CreateDate': DATE_CREATE, 'DateTimeOriginal': DATE_ORIGINAL})
+
+	# containers
+
+	def test_jpeg(self):
+		self.assertExifTags(lib_metadata.read_tags(self.write('a.jpg', jpeg())))
+
+	def test_tiff_little_endian(self):
+		self.assertExifTags(lib_metadata.read_tags(self.write('a.tif', tiff('<'))))
+
+	def test_tiff_big_endian(self):
+		self.assertExifTags(lib_metadata.read_tags(self.write('a.nef', tiff('>'))))
+
+	def test_mp4(self):
+		self.assertEqual(lib_metadata.read_tags(self.write('a.mp4', mp4())), {'CreateDate': QUICKTIME_DATE_TEXT})
+
+	def test_mp4_version_1(self):
+		self.assertEqual(lib_metadata.read_tags(self.write('a.mov', mp4(Version=1))), {'CreateDate': QUICKTIME_DATE_TEXT})
+
+	def test_heic(self):
+		self.assertExifTags(lib_metadata.read_tags(self.write('a.heic', heic())))
+
+	# values
+
+	def test_empty_dates(self):
+		Tags	= lib_metadata.read_tags(self.write('a.jpg', jpeg(tiff(DateTimeOriginal='0000:00:00 00:00:00', CreateDate='    :  :     :  :  '))))
+		self.assertEqual(Tags, {'Model': MODEL})
+
+	def test_mp4_without_date(self):
+		self.assertEqual(lib_metadata.read_tags(self.write('a.mp4', mp4(0))), {})
+
+	def test_unsupported(self):
+		self.assertIsNone(lib_metadata.read_tags(self.write('a.png', b'\x89PNG\r\n\x1a\n' + bytes(100))))
+		self.assertIsNone(lib_metadata.read_tags(self.write('a.cr3', box(b'ftyp', b'crx ' + bytes(4)) + bytes(100))))
+
+	# broken files: no exception, no wrong date
+
+	def test_truncated(self):
+		for Name, Data in [('a.jpg', jpeg()), ('a.tif', tiff()), ('a.mp4', mp4()), ('a.heic', heic())]:
+			for Length in range(len(Data)):
+				with self.subTest(Name=Name, Length=Length):
+					Tags	= lib_metadata.read_tags(self.write(Name, Data[:Length]))
+
+					for Tag, Value in (Tags or {}).items():
+						self.assertIn(Value, [MODEL, DATE_CREATE, DATE_ORIGINAL, QUICKTIME_DATE_TEXT])
+
+	def test_corrupt(self):
+		Tiff	= bytearray(tiff())
+
+		# IFD0 count far beyond the file: the entries there are still read
+		Tiff[8:10]	= struct.pack('<H', 0xffff)
+		self.assertExifTags(lib_metadata.read_tags(self.write('a.tif', bytes(Tiff))))
+
+		# EXIF IFD pointing beyond the file
+		self.assertEqual(lib_metadata.read_tags(self.write('b.tif', tiff().replace(struct.pack('<I', 38), struct.pack('<I', 0x7fffffff), 1))), {'Model': MODEL})
+
+		# JPEG segment length 0 and a box smaller than its header
+		self.assertEqual(lib_metadata.read_tags(self.write('a.jpg', b'\xff\xd8\xff\xe1\x00\x00' + bytes(100))), {})
+		self.assertEqual(lib_metadata.read_tags(self.write('a.mp4', box(b'ftyp', b'isom' + bytes(4)) + struct.pack('>I4s', 4, b'moov') + bytes(100))), {})
+
+	def test_max_bytes(self):
+		FilePathName	= self.write('a.heic', heic())
+
+		Reader	= lib_metadata.reader(FilePathName, 64)
+		self.assertLessEqual(Reader.BytesRead, 64)
+		self.assertEqual(Reader.tags, {})
+
+		Reader	= lib_metadata.reader(FilePathName)
+		self.assertExifTags(Reader.tags)
+		self.assertLessEqual(Reader.BytesRead, len(heic()) * 2)
+
+	# exiftool
+
+	@unittest.skipIf(shutil.which('exiftool') is None, 'exiftool not installed')
+	def test_exiftool(self):
+		for Name, Data in [('a.jpg', jpeg()), ('a.tif', tiff()), ('a.mp4', mp4()), ('a.heic', heic())]:
+			with self.subTest(Name=Name):
+				FilePathName	= self.write(Name, Data)
+
+				Output	= subprocess.check_output(['exiftool', '-S', '-CreateDate', '-DateTimeOriginal', '-Model', FilePathName], text=True)
+				Expected	= dict(Line.split(': ', 1) for Line in Output.splitlines() if ': ' in Line)
+
+				self.assertEqual(lib_metadata.read_tags(FilePathName), Expected)
+
+if __name__ == "__main__":
+	unittest.main()